@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+"""
+Peak RSS of loading a todo file into a GtkSource.Buffer.
+
+"decode" is the old path: load_contents, decode to str, set_text.
+"mapped" is the Notebook.direct_insert_file path: the file is mapped and
+handed to a FileLoader as GBytes.
+"reread" is the Reload path, Notebook.reread_file: load_bytes copies the
+file into a GBytes, which the FileLoader reads the same way.
+
+Each method runs in its own process so the high-water marks don't mix.
+Without PyGObject and GtkSourceView only the Python-side copies are
+measured: the bytes and the str of "decode", a mapping whose pages are
+all touched for "mapped", and one bytes copy for "reread". The buffer
+itself costs the same on every path and is left out.
+
+    python benchmarks/bench_load_rss.py [size_mb]
+
+Python-side copies only, 20 MiB ASCII file, CPython 3.11, Linux:
+
+      decode: peak +40832 KiB (1.99x file size)
+      mapped: peak +20424 KiB (1.00x file size)
+      reread: peak +20392 KiB (1.00x file size)
+
+The mapped pages are clean page cache the kernel can drop, unlike the
+anonymous copies of the other two.
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+LINE = "Call the plumber about the kitchen sink [2026-01-15 09:30]\n"
+
+
+def rss_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_without_toolkit(method, path):
+    import mmap
+    baseline = rss_kib()
+
+    if method == "decode":
+        with open(path, "rb") as f:
+            contents = f.read()
+        size = len(contents.decode("utf-8", "replace"))
+        del contents
+    elif method == "mapped":
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The loader reads every page once
+        for i in range(0, len(data), mmap.PAGESIZE):
+            data[i]
+        size = len(data)
+        data.close()
+    else:
+        with open(path, "rb") as f:
+            size = len(f.read())
+
+    print(rss_kib() - baseline, size)
+
+
+def run(method, path):
+    try:
+        import gi
+    except ImportError:
+        run_without_toolkit(method, path)
+        return
+    gi.require_version("Gio", "2.0")
+    gi.require_version("GLib", "2.0")
+    gi.require_version("GtkSource", "5")
+    from gi.repository import Gio, GLib, GtkSource
+
+    GtkSource.init()
+    buff = GtkSource.Buffer()
+    gfile = Gio.File.new_for_path(path)
+    baseline = rss_kib()
+
+    if method == "decode":
+        success, contents, _ = gfile.load_contents(None)
+        buff.set_text(contents.decode("utf-8", "replace"))
+        del contents
+    else:
+        if method == "mapped":
+            data = GLib.MappedFile.new(path, False).get_bytes()
+        else:
+            data, _ = gfile.load_bytes(None)
+        stream = Gio.MemoryInputStream.new_from_bytes(data)
+        src_file = GtkSource.File.new()
+        src_file.set_location(gfile)
+        loader = GtkSource.FileLoader.new_from_stream(buff, src_file, stream)
+        loader.set_candidate_encodings([GtkSource.Encoding.get_utf8()])
+        loop = GLib.MainLoop()
+
+        def on_loaded(loader, result, *args):
+            loader.load_finish(result)
+            loop.quit()
+
+        loader.load_async(
+            GLib.PRIORITY_DEFAULT, None, None, None, on_loaded, ())
+        loop.run()
+
+    print(rss_kib() - baseline, buff.get_char_count())
+
+
+def main():
+    if len(sys.argv) == 3:
+        run(sys.argv[1], sys.argv[2])
+        return
+
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.NamedTemporaryFile(
+            "w", suffix=".todo", delete=False, encoding="utf-8") as f:
+        # A child starts from this process's peak, so keep it low
+        count = size_mb * 1024 * 1024 // len(LINE.encode("utf-8"))
+        for _ in range(count // 1000):
+            f.write(LINE * 1000)
+        f.write(LINE * (count % 1000))
+        path = f.name
+
+    try:
+        size_kib = os.path.getsize(path) // 1024
+        print(f"file: {size_kib} KiB")
+        for method in ("decode", "mapped", "reread"):
+            out = subprocess.run(
+                [sys.executable, __file__, method, path],
+                capture_output=True, text=True, check=True).stdout.split()
+            peak = int(out[0])
+            print(f"{method:>8}: peak +{peak} KiB "
+                  f"({peak / size_kib:.2f}x file size)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+"""
+Latency of one save of a todo file under each save_durability mode.
+
+Writes go through jellypie.durable.write_file, the same code the notebook
+runs, into a directory on the filesystem being measured (default: a temp
+directory; pass the sync folder to measure that).
+
+    python benchmarks/bench_save_durability.py [size_kb] [runs] [directory]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from jellypie import durable  # noqa: E402
+
+LINE = "Call the plumber about the kitchen sink [2026-01-15 09:30]\n"
+
+
+def measure(path, data, mode, runs):
+    timings = []
+    for i in range(runs):
+        # Change a byte so no layer can skip the write
+        payload = data[:-2] + str(i % 10).encode() + b"\n"
+        started = time.perf_counter()
+        durable.write_file(path, payload, mode)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    size_kb = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    directory = sys.argv[3] if len(sys.argv) > 3 else None
+
+    count = max(1, size_kb * 1024 // len(LINE))
+    data = (LINE * count).encode("utf-8")
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        path = os.path.join(tmp, "bench.todo")
+        print(f"file: {len(data) // 1024} KiB, {runs} saves, in {tmp}")
+        for mode in durable.MODES:
+            with open(path, "wb") as f:
+                f.write(data)
+            timings = measure(path, data, mode, runs)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{mode:>9}: median {statistics.median(timings):7.2f} ms"
+                  f"   p95 {p95:7.2f} ms   max {timings[-1]:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import re
+from datetime import datetime, timedelta
+from .helper import gio, glib, config
+
+DONE_LINE = re.compile(r"^✓ .* \[(\d{4}-\d{2}-\d{2} \d{2}:\d{2})\]$")
+LINES_PER_SLICE = 2000
+
+
+def archive_path(filepath):
+    return f"{filepath}.archive.gz"
+
+
+class Archiver:
+    """
+    Moves old completed items out of the todo file into a gzip archive.
+
+    Rotation only starts once the configured file grows past
+    archive_size_budget bytes. The buffer is scanned a slice at a time at
+    idle priority, and each rotation appends one gzip member to the archive,
+    so `zcat` reads the whole history back in order. Lines are only cut
+    from the file if it was not edited during the write; otherwise they are
+    remembered as archived and cut by the next rotation without being
+    written twice.
+    """
+
+    def __init__(self, notebook):
+        self.nb = notebook
+        self.running = False
+        self.archived = set()
+
+    def maybe_rotate(self, key, filename):
+        filepath = config.get_filepath()
+        if self.running or filename != filepath:
+            return
+
+        days = config.get_config("archive_after_days")
+        budget = config.get_config("archive_size_budget")
+        if not days or not budget:
+            return
+
+        try:
+            if os.path.getsize(filepath) <= budget:
+                return
+        except OSError:
+            return
+
+        editor = self.nb.editor_instance.get(key)
+        if editor is None:
+            return
+        buff = editor.get_buffer()
+        if buff.get_modified() or getattr(buff, "_is_loading", False):
+            return
+
+        self.running = True
+        cutoff = datetime.now() - timedelta(days=days)
+        store = self.nb.done_stores.get(key)
+        state = {"line": 0, "found": [], "index": 0, "stored": []}
+
+        def is_old(text):
+            match = DONE_LINE.match(text)
+            return match and datetime.strptime(
+                match.group(1), "%Y-%m-%d %H:%M") < cutoff
+
+        def scan_store():
+            # Completed items hidden from the buffer are older than any
+            # still in it, so they go first in the archive
+            index = state["index"]
+            stop = min(len(store.lines), index + LINES_PER_SLICE)
+            while index < stop:
+                text = store.lines[index].decode("utf-8", "replace")
+                if is_old(text):
+                    state["stored"].append(index)
+                index += 1
+            state["index"] = index
+            return index < len(store.lines)
+
+        def scan():
+            if getattr(buff, "_closed", False) or buff.get_modified():
+                self.running = False
+                return False
+
+            total = buff.get_line_count()
+            line = state["line"]
+            stop = min(total, line + LINES_PER_SLICE)
+            while line < stop:
+                success, start = buff.get_iter_at_line(line)
+                if success and start.get_char() == "✓":
+                    end = start.copy()
+                    if not end.ends_line():
+                        end.forward_to_line_end()
+                    text = buff.get_text(start, end, False)
+                    if is_old(text):
+                        state["found"].append((line, text))
+                line += 1
+
+            state["line"] = line
+            if line < total:
+                return True
+            if store and scan_store():
+                return True
+
+            if state["found"] or state["stored"]:
+                self.write_archive(key, buff, filepath, state["found"],
+                                   store, state["stored"])
+            else:
+                self.running = False
+            return False
+
+        glib.idle_add(scan, priority=glib.PRIORITY_LOW)
+
+    def write_archive(self, key, buff, filepath, found, store, stored):
+        texts = [store.lines[i].decode("utf-8", "replace") for i in stored] + \
+            [text for _, text in found]
+        data = "".join(
+            f"{text}\n" for text in texts
+            if text not in self.archived).encode("utf-8")
+        if not data:
+            self.remove_lines(key, buff, filepath, found, store, stored)
+            return
+        gfile = gio.File.new_for_path(archive_path(filepath))
+
+        def fail(e):
+            print(f"Warning: Could not archive completed items: {e}")
+            self.running = False
+
+        def on_closed(stream, res, *args):
+            try:
+                stream.close_finish(res)
+            except glib.Error as e:
+                fail(e)
+                return
+            self.archived.update(texts)
+            self.remove_lines(key, buff, filepath, found, store, stored)
+
+        def write_from(stream, offset):
+            chunk = glib.Bytes.new(data[offset:])
+            stream.write_bytes_async(
+                chunk, glib.PRIORITY_LOW, None, on_written, offset)
+
+        def on_written(stream, res, offset):
+            try:
+                offset += stream.write_bytes_finish(res)
+            except glib.Error as e:
+                fail(e)
+                return
+            if offset < len(data):
+                write_from(stream, offset)
+            else:
+                stream.close_async(glib.PRIORITY_LOW, None, on_closed, None)
+
+        def on_opened(file, res, *args):
+            try:
+                base = file.append_to_finish(res)
+            except glib.Error as e:
+                fail(e)
+                return
+            compressor = gio.ZlibCompressor.new(
+                gio.ZlibCompressorFormat.GZIP, -1)
+            write_from(gio.ConverterOutputStream.new(base, compressor), 0)
+
+        gfile.append_to_async(
+            gio.FileCreateFlags.NONE, glib.PRIORITY_LOW, None, on_opened, None)
+
+    def remove_lines(self, key, buff, filepath, found, store, stored):
+        self.running = False
+        editor = self.nb.editor_instance.get(key)
+        if editor is None or getattr(buff, "_closed", False):
+            return
+
+        def line_bounds(line):
+            success, start = buff.get_iter_at_line(line)
+            if not success:
+                return None, None
+            end = start.copy()
+            if not end.ends_line():
+                end.forward_to_line_end()
+            return start, end
+
+        def unchanged(line, text):
+            start, end = line_bounds(line)
+            return start is not None and \
+                buff.get_text(start, end, False) == text
+
+        # Edited, reloaded or saved over since the scan: the lines stay in
+        # self.archived until a rotation finds the file quiet
+        if buff.get_modified() or getattr(buff, "_is_loading", False) or \
+                stored and self.nb.done_stores.get(key) is not store or \
+                not all(unchanged(line, text) for line, text in found):
+            return
+
+        if stored:
+            cut = set(stored)
+            store.lines = [
+                line for i, line in enumerate(store.lines) if i not in cut]
+
+        # Bottom-up so the earlier line numbers stay valid
+        buff.begin_user_action()
+        for line, _ in reversed(found):
+            start, end = line_bounds(line)
+            if not end.is_end():
+                end.forward_char()
+            buff.delete(start, end)
+        buff.end_user_action()
+
+        self.archived.clear()
+        if found or stored:
+            self.nb.save_the_file(filepath, editor, key)
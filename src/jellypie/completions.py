@@ -0,0 +1,157 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+from . import durable
+from .done import DONE_MARK
+
+
+def log_path(filename):
+    return f"{filename}.done.log"
+
+
+def marked_line(item, timestamp):
+    return f"{DONE_MARK} {item} [{timestamp}]"
+
+
+class CompletionLog:
+    """
+    Sidecar log of items marked done since the todo file was last saved.
+
+    Each completion appends one short record, so marking an item done costs
+    a small append instead of a rewrite of the whole file. The next save
+    folds the completions into the file and removes the log; if the app
+    never gets there, the records are applied again on the next load.
+    """
+
+    def __init__(self, filename):
+        self.path = log_path(filename)
+
+    def append(self, item, timestamp):
+        record = json.dumps({"item": item, "time": timestamp},
+                            ensure_ascii=False)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(record + "\n")
+        except OSError as e:
+            print(f"Warning: Could not write {self.path}: {e}")
+            return False
+        return True
+
+    def records(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read {self.path}: {e}")
+            return []
+
+    def retain(self, lines):
+        """
+        Drop the records whose marked line is not among lines, as after an
+        undo took the completion back out of the buffer.
+        """
+        records = self.records()
+        kept = [r for r in records
+                if marked_line(r["item"], r["time"]) in lines]
+        if len(kept) == len(records):
+            return
+        if not kept:
+            self.remove()
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in kept)
+        try:
+            durable.write_file(self.path, data.encode("utf-8"), "relaxed")
+        except OSError as e:
+            print(f"Warning: Could not write {self.path}: {e}")
+
+    def pending(self):
+        return os.path.exists(self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def replay(self, buff, done_lines=()):
+        """
+        Apply logged completions the file does not have yet. Returns the
+        number applied.
+        """
+        start, end = buff.get_bounds()
+        text = buff.get_text(start, end, False)
+        present = set(text.split("\n"))
+        present.update(line.decode("utf-8", "replace") for line in done_lines)
+
+        applied = 0
+        buff.begin_user_action()
+        for record in self.records():
+            marked = marked_line(record["item"], record["time"])
+            if marked in present:
+                continue
+            self.remove_item(buff, record["item"])
+            end = buff.get_end_iter()
+            if not end.starts_line():
+                buff.insert(end, "\n")
+                end = buff.get_end_iter()
+            buff.insert(end, marked + "\n")
+            present.add(marked)
+            applied += 1
+        buff.end_user_action()
+        return applied
+
+    def apply(self, text):
+        """
+        Fold the logged completions into the text of the file itself, as
+        replay does for a buffer. Returns the new text and the number
+        applied.
+        """
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        present = set(lines)
+
+        applied = 0
+        for record in self.records():
+            marked = marked_line(record["item"], record["time"])
+            if marked in present:
+                continue
+            if record["item"] in lines:
+                lines.remove(record["item"])
+            lines.append(marked)
+            present.add(marked)
+            applied += 1
+        return "".join(line + "\n" for line in lines), applied
+
+    def remove_item(self, buff, item):
+        for line in range(buff.get_line_count()):
+            success, start = buff.get_iter_at_line(line)
+            if not success:
+                continue
+            end = start.copy()
+            if not end.ends_line():
+                end.forward_to_line_end()
+            if buff.get_text(start, end, False) == item:
+                if not end.is_end():
+                    end.forward_char()
+                buff.delete(start, end)
+                return
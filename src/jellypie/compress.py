@@ -0,0 +1,136 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import gzip
+import threading
+from .helper import gio, glib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+
+def codec_for(path):
+    """Compression used by the file at path, from its extension."""
+    for suffix, codec in SUFFIXES.items():
+        if path and path.endswith(suffix):
+            return codec
+    return None
+
+
+def plain_name(path):
+    """The path without its compression suffix, for guessing the language."""
+    codec = codec_for(path)
+    return path[:path.rindex(".")] if codec else path
+
+
+def check_available(codec):
+    if codec == "zstd" and zstandard is None:
+        raise OSError(
+            "Reading .zst files needs the zstandard Python package")
+
+
+def compress(codec, data):
+    if codec == "gzip":
+        # mtime=0 so identical text gives identical bytes for the sync client
+        return gzip.compress(data, mtime=0)
+    if codec == "zstd":
+        check_available(codec)
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(codec, data):
+    if codec == "gzip":
+        return gzip.decompress(data) if data else b""
+    if codec == "zstd":
+        check_available(codec)
+        if not data:
+            return b""
+        with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+            return reader.read()
+    return data
+
+
+def open_stream_async(gfile, codec, callback, cancellable=None):
+    """
+    Open an input stream of the decompressed contents off the main loop,
+    then call callback(stream, error). gzip is decompressed as the loader
+    reads; zstd has no GIO converter, so the stream comes back as None and
+    the caller goes through read_async instead.
+    """
+    if codec != "gzip":
+        callback(None, None)
+        return
+
+    def on_opened(file, result, *args):
+        if cancellable is not None and cancellable.is_cancelled():
+            return
+        try:
+            base = file.read_finish(result)
+        except glib.Error as e:
+            callback(None, e)
+            return
+        decompressor = gio.ZlibDecompressor.new(
+            gio.ZlibCompressorFormat.GZIP)
+        callback(gio.ConverterInputStream.new(base, decompressor), None)
+
+    gfile.read_async(glib.PRIORITY_DEFAULT, cancellable, on_opened, None)
+
+
+def read_async(gfile, callback, cancellable=None):
+    """
+    Read and decompress gfile off the main loop, then call
+    callback(data, error) from it, unless cancellable is cancelled first.
+    """
+    codec = codec_for(gfile.get_path())
+
+    def cancelled():
+        return cancellable is not None and cancellable.is_cancelled()
+
+    def on_read(file, result, *args):
+        if cancelled():
+            return
+        try:
+            success, contents, etag = file.load_contents_finish(result)
+        except glib.Error as e:
+            callback(None, e)
+            return
+        if codec is None:
+            callback(contents, None)
+            return
+
+        def work():
+            try:
+                data, error = decompress(codec, contents), None
+            except Exception as e:
+                data, error = None, e
+
+            def deliver():
+                if not cancelled():
+                    callback(data, error)
+                return False
+
+            glib.idle_add(deliver)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    gfile.load_contents_async(cancellable, on_read, None)
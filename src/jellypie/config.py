@@ -35,11 +35,14 @@
 DEFAULT_SHORTCUTS = {
     "save": "<Control>s",
     "find": "<Control>f",
+    "replace": "<Control>r",
     "go_to_line": "<Control>g",
     "font": "F6",
     "quick_help": "F1",
     "quit": "<Control>q",
     "mark_done": "<Control>d",
+    "show_done": "<Control><Shift>d",
+    "history": "<Control><Shift>h",
     "format_bold": "<Control>b",
     "format_italic": "<Control>i",
     "format_monospace": "<Control>t",
@@ -55,4 +58,21 @@ DEFAULT_CONFIG = {
     "shortcuts": DEFAULT_SHORTCUTS,
     "window_width": -1,
     "window_height": -1,
+    "large_file_threshold": 2097152,
+    "viewer_threshold": 134217728,
+    "performance_mode": "auto",
+    "performance_mode_size": 8388608,
+    "performance_mode_lines": 100000,
+    "performance_mode_line_length": 100000,
+    "long_line_limit": 10000,
+    "archive_after_days": 30,
+    "archive_size_budget": 1048576,
+    "hide_done_items": False,
+    "auto_reload": False,
+    "save_durability": "full",
+    "history_budget": 10485760,
+    "completion_log": False,
+    "replica_dir": "",
+    "search_engine": "auto",
+    "regex_time_budget": 2.0,
 }
@@ -0,0 +1,167 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import difflib
+import re
+
+# Above this many lines on both sides of the changed middle, one replace
+# is cheaper than asking SequenceMatcher for a minimal diff
+MATCH_LIMIT = 20000
+
+# A line with its ending, broken only where GtkTextBuffer breaks lines, so
+# list indexes match buffer line numbers
+LINE = re.compile(r"[^\n\r\u2029]*(?:\r\n|[\n\r\u2029])|[^\n\r\u2029]+\Z")
+
+
+def split_lines(text):
+    """Lines of text with their endings, numbered as the buffer numbers them."""
+    return LINE.findall(text)
+
+
+def line_hunks(old, new):
+    """
+    Changed ranges between two lists of lines, as
+    (old_start, old_end, new_start, new_end) tuples in ascending order.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    a = old[prefix:len(old) - suffix]
+    b = new[prefix:len(new) - suffix]
+    if not a and not b:
+        return []
+    if not a or not b or min(len(a), len(b)) > MATCH_LIMIT:
+        return [(prefix, prefix + len(a), prefix, prefix + len(b))]
+
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    return [
+        (prefix + i1, prefix + i2, prefix + j1, prefix + j2)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def apply_hunks(buff, old, new, hunks):
+    """Edit buff, holding the lines old, into new as one user action."""
+    def line_start(line):
+        if line >= len(old):
+            return buff.get_end_iter()
+        return buff.get_iter_at_line(line)[1]
+
+    # Bottom-up so the earlier line numbers stay valid
+    buff.begin_user_action()
+    for i1, i2, j1, j2 in reversed(hunks):
+        start = line_start(i1)
+        if i2 > i1:
+            end = line_start(i2)
+            buff.delete(start, end)
+            start = line_start(i1)
+        if j2 > j1:
+            buff.insert(start, "".join(new[j1:j2]))
+    buff.end_user_action()
+
+
+def hunk_ops(old, new, hunks):
+    """Journal records that turn the text of old into new."""
+    offsets = [0]
+    for line in old:
+        offsets.append(offsets[-1] + len(line))
+
+    ops = []
+    for i1, i2, j1, j2 in reversed(hunks):
+        if i2 > i1:
+            ops.append(["d", offsets[i1], offsets[i2] - offsets[i1]])
+        if j2 > j1:
+            ops.append(["i", offsets[i1], "".join(new[j1:j2])])
+    return ops
+
+
+def conflict_side(lines):
+    if lines and not lines[-1].endswith("\n"):
+        return lines[:-1] + [lines[-1] + "\n"]
+    return lines
+
+
+def merge3(base, ours, theirs):
+    """
+    Line-level three-way merge. Returns the merged lines and the number of
+    conflicts, each of which is left in the text between markers.
+    """
+    a = line_hunks(base, ours)
+    b = line_hunks(base, theirs)
+    result = []
+    conflicts = 0
+    pos = i = j = 0
+    delta_a = delta_b = 0
+
+    while i < len(a) or j < len(b):
+        start = min(
+            a[i][0] if i < len(a) else len(base),
+            b[j][0] if j < len(b) else len(base))
+        result.extend(base[pos:start])
+
+        # Grow the region until no hunk on either side overlaps it. A hunk
+        # that starts where the region ends only touches it, so edits to
+        # neighbouring lines merge; insertions at one spot still collide
+        end = start
+        ia, jb = i, j
+
+        def overlaps(hunk):
+            return hunk[0] < end or hunk[0] == start == end
+
+        grown = True
+        while grown:
+            grown = False
+            if ia < len(a) and overlaps(a[ia]):
+                end = max(end, a[ia][1])
+                ia += 1
+                grown = True
+            if jb < len(b) and overlaps(b[jb]):
+                end = max(end, b[jb][1])
+                jb += 1
+                grown = True
+
+        span_a = sum((h[3] - h[2]) - (h[1] - h[0]) for h in a[i:ia])
+        span_b = sum((h[3] - h[2]) - (h[1] - h[0]) for h in b[j:jb])
+        mine = ours[start + delta_a:end + delta_a + span_a]
+        other = theirs[start + delta_b:end + delta_b + span_b]
+
+        if ia == i or mine == other:
+            result.extend(other)
+        elif jb == j:
+            result.extend(mine)
+        else:
+            conflicts += 1
+            result.append("<<<<<<< buffer\n")
+            result.extend(conflict_side(mine))
+            result.append("=======\n")
+            result.extend(conflict_side(other))
+            result.append(">>>>>>> disk\n")
+
+        delta_a += span_a
+        delta_b += span_b
+        pos = end
+        i, j = ia, jb
+
+    result.extend(base[pos:])
+    return result, conflicts
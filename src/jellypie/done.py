@@ -0,0 +1,102 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+DONE_MARK = "✓"
+
+
+def done_block_start(buff):
+    """Iter at the first line of the trailing block of ✓ lines, or None."""
+    line = buff.get_line_count() - 1
+    success, it = buff.get_iter_at_line(line)
+    if success and it.ends_line():
+        line -= 1
+
+    start = None
+    while line >= 0:
+        success, it = buff.get_iter_at_line(line)
+        if not success or it.get_char() != DONE_MARK:
+            break
+        start = it
+        line -= 1
+    return start
+
+
+def split_done_text(text):
+    """Split text into the lines before the trailing ✓ block and the block."""
+    parts = text.split("\n")
+    end = len(parts) - 1 if parts[-1] == "" else len(parts)
+    start = end
+    while start > 0 and parts[start - 1].startswith(DONE_MARK):
+        start -= 1
+    if start == end:
+        return text, []
+    visible = "".join(f"{part}\n" for part in parts[:start])
+    return visible, [part.encode("utf-8") for part in parts[start:end]]
+
+
+def join_file(head, lines, tail):
+    """File contents from the text either side of the stored lines."""
+    head = head.encode("utf-8")
+    if head and not head.endswith(b"\n"):
+        head += b"\n"
+    tail = tail.encode("utf-8")
+    if tail and not tail.endswith(b"\n"):
+        tail += b"\n"
+    stored = b"".join(line + b"\n" for line in lines)
+    return head + stored + tail
+
+
+class DoneStore:
+    """
+    Completed items held outside the buffer.
+
+    The trailing block of ✓ lines is cut from the buffer after loading and
+    kept as a list of encoded lines, so layout, highlighting and search only
+    see the open items. On save the lines go back in just before any items
+    completed since the load, which keeps the file identical in format.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def __len__(self):
+        return len(self.lines)
+
+    def extract(self, buff):
+        start = done_block_start(buff)
+        if start is None:
+            return
+
+        end = buff.get_end_iter()
+        text = buff.get_text(start, end, False)
+        self.lines = [
+            line.encode("utf-8") for line in text.split("\n") if line]
+
+        buff.begin_irreversible_action()
+        buff.delete(start, end)
+        buff.end_irreversible_action()
+        buff.set_modified(False)
+
+    def split_text(self, buff):
+        """The buffer text either side of where the stored lines go."""
+        start = done_block_start(buff)
+        if start is None:
+            start = buff.get_end_iter()
+        head = buff.get_text(buff.get_start_iter(), start, False)
+        tail = buff.get_text(start, buff.get_end_iter(), False)
+        return head, list(self.lines), tail
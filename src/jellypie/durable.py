@@ -0,0 +1,147 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import errno
+import os
+import tempfile
+
+MODES = ("full", "relaxed", "in_place")
+
+
+def fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def umask():
+    # Only readable by setting it, so read it once before any writer thread
+    # could create a file in between
+    mask = os.umask(0o22)
+    os.umask(mask)
+    return mask
+
+
+# What open() gives a new file, where mkstemp would give 0600
+NEW_FILE_MODE = 0o666 & ~umask()
+
+
+def check_cancelled(cancellable):
+    if cancellable is not None and cancellable.is_cancelled():
+        raise InterruptedError("Write cancelled")
+
+
+def write_in_place(path, data, cancellable=None):
+    check_cancelled(cancellable)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.write(data)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def copy_owner(fd, st):
+    own = os.fstat(fd)
+    if (own.st_uid, own.st_gid) == (st.st_uid, st.st_gid):
+        return
+    try:
+        os.fchown(fd, st.st_uid, st.st_gid)
+    except PermissionError:
+        # Only root can give a file away, but the group can be kept by
+        # any of its members
+        try:
+            os.fchown(fd, -1, st.st_gid)
+        except PermissionError:
+            pass
+
+
+def copy_xattrs(fd, path):
+    """Carry over extended attributes, POSIX ACLs among them."""
+    if not hasattr(os, "listxattr"):
+        return
+    try:
+        names = os.listxattr(path)
+    except OSError:
+        return
+    for name in names:
+        try:
+            os.setxattr(fd, name, os.getxattr(path, name))
+        except OSError:
+            pass
+
+
+def write_file(path, data, mode="full", cancellable=None):
+    """
+    Write data to path. A cancelled cancellable stops the write before
+    path is touched.
+
+    full      temp file, fsync, rename over path, fsync the directory
+    relaxed   temp file and rename, leaving the flush to the kernel
+    in_place  truncate and rewrite path itself, for sync folders that
+              treat a rename as delete plus create
+
+    The renaming modes keep the owner, mode and extended attributes of
+    the file they replace; a file with other hard links is always
+    rewritten in place.
+    """
+    if mode == "in_place":
+        write_in_place(path, data, cancellable)
+        return
+
+    # Replace the target of a symlink, not the link
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    # The rename would go through for a file only its directory lets us
+    # replace, so refuse as a plain write would
+    if st is not None and not os.access(path, os.W_OK):
+        raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), path)
+    # A rename would split the file from its other names
+    if st is not None and st.st_nlink > 1:
+        write_in_place(path, data, cancellable)
+        return
+
+    fd, tmp = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if st is not None:
+                copy_owner(f.fileno(), st)
+                copy_xattrs(f.fileno(), path)
+            os.fchmod(f.fileno(), st.st_mode & 0o7777
+                      if st is not None else NEW_FILE_MODE)
+            f.write(data)
+            if mode == "full":
+                f.flush()
+                os.fsync(f.fileno())
+        check_cancelled(cancellable)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    if mode == "full":
+        fsync_dir(directory)
@@ -16,7 +16,10 @@
 # with Jollpi. if not, see <https://www.gnu.org/licenses/>.
 
 
-from .helper import gtk, gtksource, config, gdk
+from .helper import gtk, gtksource, config, gdk, glib
+
+SCAN_SLICE = 5000
+BOTTOM_MARGIN = 200
 
 
 class Editor(gtksource.View):
@@ -74,13 +77,146 @@ class Editor(gtksource.View):
         click = gtk.GestureClick()
         click.connect("pressed", self.on_gutter_click)
         gutter.add_controller(click)
-        self.set_bottom_margin(200)
+        self.set_bottom_margin(BOTTOM_MARGIN)
+
+        self.performance_mode = False
+        self.longest_line = 0
+        self.scanned_size = 0
+        self.scan_id = None
+        # Saves the word-break search only; GTK still lays out the whole
+        # line, so a huge one stays slow to display
+        self.long_line_tag = self.buff.create_tag(
+            "long-line", wrap_mode=gtk.WrapMode.CHAR)
+        self.buff.connect_after("insert-text", self.on_text_inserted)
+
+    def has_long_lines(self):
+        return self.longest_line > config.get_config("long_line_limit")
+
+    def update_highlighting(self):
+        self.buff.set_highlight_syntax(
+            not (self.performance_mode or self.has_long_lines()))
+
+    def set_performance_mode(self, enabled):
+        if enabled == self.performance_mode:
+            return
+        self.performance_mode = enabled
+
+        self.set_wrap_mode(
+            gtk.WrapMode.NONE if enabled else gtk.WrapMode.WORD_CHAR)
+        self.set_highlight_current_line(not enabled)
+        self.set_show_line_marks(not enabled)
+        self.set_show_right_margin(not enabled)
+        self.set_bottom_margin(0 if enabled else BOTTOM_MARGIN)
+        self.update_highlighting()
+
+    def update_performance_mode(self):
+        """
+        Turn performance mode on or off for the current document size.
+        Returns False when the lines must be rescanned before deciding.
+        """
+        size = self.buff.get_char_count()
+        too_big = (
+            size > config.get_config("performance_mode_size") or
+            self.buff.get_line_count() >
+            config.get_config("performance_mode_lines"))
+
+        # Deletions can shorten the longest line without us noticing
+        if self.has_long_lines() and not too_big and \
+                size < self.scanned_size:
+            return False
+
+        too_long = self.longest_line > \
+            config.get_config("performance_mode_line_length")
+        setting = config.get_config("performance_mode")
+        if isinstance(setting, bool):
+            self.set_performance_mode(setting)
+        else:
+            self.set_performance_mode(too_big or too_long)
+        self.update_highlighting()
+        return True
+
+    def line_length(self, line):
+        success, it = self.buff.get_iter_at_line(line)
+        return it.get_chars_in_line() if success else 0
+
+    def on_text_inserted(self, buff, location, text, length):
+        if getattr(buff, "_is_loading", False) or \
+                getattr(buff, "_is_viewer", False):
+            return
+        had_long_lines = self.has_long_lines()
+        end_line = location.get_line()
+        first_line = end_line - text.count("\n")
+        for line in range(first_line, end_line + 1):
+            self.longest_line = max(self.longest_line, self.line_length(line))
+
+        if self.has_long_lines():
+            # Tag once the insertion has finished
+            glib.idle_add(self.tag_long_lines, first_line, end_line)
+            if not had_long_lines:
+                self.update_highlighting()
+
+    def tag_long_line(self, it):
+        """Soft-wrap the line at it by character if it is over the limit."""
+        if it.get_chars_in_line() <= config.get_config("long_line_limit") \
+                or it.has_tag(self.long_line_tag):
+            return
+        end = it.copy()
+        if not end.ends_line():
+            end.forward_to_line_end()
+        self.buff.apply_tag(self.long_line_tag, it, end)
+
+    def tag_long_lines(self, first_line, last_line):
+        buff = getattr(self, "buff", None)
+        if buff is None:
+            return False
+        for line in range(first_line, last_line + 1):
+            success, it = buff.get_iter_at_line(line)
+            if success:
+                self.tag_long_line(it)
+        return False
+
+    def scan_lines(self, on_done=None):
+        """Measure every line in idle slices, then call on_done."""
+        if self.scan_id:
+            glib.source_remove(self.scan_id)
+        state = {"line": 0, "longest": 0}
+
+        def step():
+            buff = getattr(self, "buff", None)
+            if buff is None:
+                self.scan_id = None
+                return False
+
+            total = buff.get_line_count()
+            line = state["line"]
+            if line == 0:
+                buff.remove_tag(self.long_line_tag, *buff.get_bounds())
+            stop = min(total, line + SCAN_SLICE)
+            success, it = buff.get_iter_at_line(line)
+            while success and line < stop:
+                state["longest"] = max(state["longest"], it.get_chars_in_line())
+                self.tag_long_line(it)
+                it.forward_line()
+                line += 1
+
+            state["line"] = line
+            if success and line < total:
+                return True
+
+            self.scan_id = None
+            self.longest_line = state["longest"]
+            self.scanned_size = buff.get_char_count()
+            if on_done:
+                on_done()
+            return False
+
+        self.scan_id = glib.idle_add(step, priority=glib.PRIORITY_LOW)
 
     def on_key_press_event(self, controller, keyval, keycode, state):
         if getattr(self.buff, "_is_loading", False):
             return True
 
-        if keyval in self.PAIRS:
+        if keyval in self.PAIRS and self.get_editable():
             left, right = self.PAIRS[keyval]
             self.insert_pair(left, right)
             return True
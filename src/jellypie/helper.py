@@ -16,6 +16,7 @@
 # with Jollpi. if not, see <https://www.gnu.org/licenses/>.
 
 
+import hashlib
 import json
 import os
 import gi
@@ -113,6 +114,16 @@ def get_css_path():
         return os.path.join(basedir(), CUSTOM_CSS)
 
 
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def text_bytes(text):
+    """A buffer's text as saved: UTF-8, ending in a newline."""
+    text += "\n" if not text.endswith("\n") else ""
+    return text.encode("utf-8")
+
+
 def get_app_version():
     try:
         return version(APP_NAME)
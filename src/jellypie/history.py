@@ -0,0 +1,224 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from .helper import CONFIG_PATH
+
+HISTORY_DIR = os.path.join(os.path.dirname(CONFIG_PATH), "history")
+BOUNDARY = 32
+MAX_CHUNK = 64 * 1024
+
+
+def history_dir(filename):
+    name = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(HISTORY_DIR, name)
+
+
+def split_chunks(data):
+    """
+    Cut data into whole-line chunks. A chunk ends after any line whose
+    checksum is a multiple of BOUNDARY, so the cut points depend only on
+    nearby text and an edit changes just the chunks around it.
+    """
+    chunks = []
+    start = pos = 0
+    for line in data.splitlines(keepends=True):
+        pos += len(line)
+        if zlib.crc32(line) % BOUNDARY == 0 or pos - start >= MAX_CHUNK:
+            chunks.append(data[start:pos])
+            start = pos
+    if start < len(data):
+        chunks.append(data[start:])
+    return chunks
+
+
+def chunk_digest(chunk):
+    return hashlib.blake2b(chunk, digest_size=16).hexdigest()
+
+
+class History:
+    """
+    Saved versions of one file, stored by content.
+
+    Each version is split into line-aligned chunks. Chunks go into an
+    append-only pack file under their digest, so text that did not change
+    between saves is stored once, and each save only appends its new chunks
+    and one manifest line listing the digests in order. The first line of
+    the manifest file names the pack and index in use, so a prune writes
+    new ones beside them and switches over with one rename.
+    """
+
+    def __init__(self, filename):
+        self.dir = history_dir(filename)
+        self.manifest_path = os.path.join(self.dir, "manifests.jsonl")
+        self.lock = threading.Lock()
+        self.index = None
+
+    def locate(self):
+        """Set the pack and index paths from the manifest header."""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+        except (OSError, ValueError):
+            header = {}
+        if "pack" not in header:
+            # Histories from before the header have fixed names
+            header = {"pack": "chunks.pack", "index": "chunks.idx"}
+        self.pack_path = os.path.join(self.dir, header["pack"])
+        self.index_path = os.path.join(self.dir, header["index"])
+
+    def load_index(self):
+        if self.index is None:
+            self.locate()
+            self.index = {}
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    for line in f:
+                        digest, offset, length = line.split()
+                        self.index[digest] = (int(offset), int(length))
+            except (OSError, ValueError):
+                pass
+        return self.index
+
+    def versions(self):
+        """Manifests of the saved versions, oldest first."""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+        return [record for record in records if "chunks" in record]
+
+    def record_async(self, data, budget):
+        threading.Thread(
+            target=self.record, args=(data, budget), daemon=True).start()
+
+    def record(self, data, budget):
+        with self.lock:
+            try:
+                self.append_version(data)
+                if os.path.getsize(self.pack_path) > budget:
+                    self.prune(budget)
+            except OSError as e:
+                print(f"Warning: Could not record history: {e}")
+
+    def append_version(self, data):
+        os.makedirs(self.dir, exist_ok=True)
+        index = self.load_index()
+        chunks = split_chunks(data)
+        digests = [chunk_digest(chunk) for chunk in chunks]
+
+        versions = self.versions()
+        if versions and versions[-1]["chunks"] == digests:
+            return
+
+        entries = []
+        with open(self.pack_path, "ab") as pack:
+            offset = pack.tell()
+            for digest, chunk in zip(digests, chunks):
+                if digest in index:
+                    continue
+                packed = zlib.compress(chunk)
+                pack.write(packed)
+                index[digest] = (offset, len(packed))
+                entries.append(f"{digest} {offset} {len(packed)}\n")
+                offset += len(packed)
+
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.writelines(entries)
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "time": int(time.time()), "size": len(data),
+                "chunks": digests}) + "\n")
+
+    def rebuild(self, manifest):
+        """The contents of one saved version."""
+        with self.lock:
+            index = self.load_index()
+            parts = []
+            with open(self.pack_path, "rb") as pack:
+                for digest in manifest["chunks"]:
+                    offset, length = index[digest]
+                    pack.seek(offset)
+                    parts.append(zlib.decompress(pack.read(length)))
+            return b"".join(parts)
+
+    def prune(self, budget):
+        """
+        Drop the oldest versions until the chunks the rest need fit in
+        three quarters of budget, then rewrite the pack without the others.
+        """
+        index = self.load_index()
+        kept = []
+        needed = set()
+        size = 0
+        for manifest in reversed(self.versions()):
+            new = set(manifest["chunks"]) - needed
+            extra = sum(index[d][1] for d in new if d in index)
+            if kept and size + extra > budget * 3 // 4:
+                break
+            kept.append(manifest)
+            needed |= new
+            size += extra
+        kept.reverse()
+
+        name = f"chunks.{time.time_ns():x}"
+        pack_path = os.path.join(self.dir, name + ".pack")
+        index_path = os.path.join(self.dir, name + ".idx")
+        new_index = {}
+        entries = []
+        with open(self.pack_path, "rb") as old, open(pack_path, "wb") as pack:
+            for digest in sorted(needed, key=lambda d: index[d][0]):
+                offset, length = index[digest]
+                old.seek(offset)
+                new_index[digest] = (pack.tell(), length)
+                entries.append(f"{digest} {pack.tell()} {length}\n")
+                pack.write(old.read(length))
+            pack.flush()
+            os.fsync(pack.fileno())
+        with open(index_path, "w", encoding="utf-8") as f:
+            f.writelines(entries)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Until this rename the old manifest still names the old pack
+        header = {"pack": name + ".pack", "index": name + ".idx"}
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.writelines(json.dumps(m) + "\n" for m in kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+        self.pack_path = pack_path
+        self.index_path = index_path
+        self.index = new_index
+        # Including any left by a prune that crashed before its rename
+        for entry in os.listdir(self.dir):
+            path = os.path.join(self.dir, entry)
+            if entry.startswith("chunks.") and \
+                    path not in (pack_path, index_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
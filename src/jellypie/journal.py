@@ -0,0 +1,218 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import json
+import os
+from .helper import glib, CONFIG_PATH
+
+JOURNAL_DIR = os.path.join(os.path.dirname(CONFIG_PATH), "journal")
+FLUSH_DELAY = 1000
+
+
+def journal_path(filename):
+    name = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(JOURNAL_DIR, f"{name}.jnl")
+
+
+def file_stamp(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class Journal:
+    """
+    Write-ahead log of the unsaved edits made to one file.
+
+    Inserts and deletes are batched in memory and appended to the journal
+    on a short timer. The first line records the size and mtime of the file
+    the edits apply to, so a journal is only replayed onto that same file.
+    """
+
+    def __init__(self, filename, buff):
+        self.filename = filename
+        self.path = journal_path(filename)
+        self.buff = buff
+        self.base = file_stamp(filename)
+        self.pending = []
+        self.timeout_id = None
+        self.replaying = False
+        self.drop_stale()
+        self.handlers = [
+            buff.connect("insert-text", self.on_insert_text),
+            buff.connect("delete-range", self.on_delete_range),
+        ]
+
+    def drop_stale(self):
+        """Remove a journal left against another version of the file."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            header = None
+        # New edits appended after ops meant for other contents would
+        # corrupt the buffer if the journal were ever replayed
+        if not isinstance(header, dict) or header.get("base") != self.base:
+            self.remove()
+
+    def on_insert_text(self, buff, location, text, length):
+        if self.replaying or getattr(buff, "_is_loading", False):
+            return
+
+        offset = location.get_offset()
+        last = self.pending[-1] if self.pending else None
+        if last and last[0] == "i" and last[1] + len(last[2]) == offset:
+            last[2] += text
+        else:
+            self.pending.append(["i", offset, text])
+        self.schedule_flush()
+
+    def on_delete_range(self, buff, start, end):
+        if self.replaying or getattr(buff, "_is_loading", False):
+            return
+
+        offset = start.get_offset()
+        length = end.get_offset() - offset
+        last = self.pending[-1] if self.pending else None
+        if last and last[0] == "d" and last[1] == offset + length:
+            last[1] = offset
+            last[2] += length
+        elif last and last[0] == "d" and last[1] == offset:
+            last[2] += length
+        else:
+            self.pending.append(["d", offset, length])
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.timeout_id is None:
+            self.timeout_id = glib.timeout_add(FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        self.timeout_id = None
+        if not self.pending:
+            return False
+
+        records = [json.dumps(op, ensure_ascii=False) for op in self.pending]
+        self.pending = []
+
+        try:
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            is_new = not os.path.exists(self.path)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if is_new:
+                    f.write(json.dumps({
+                        "file": self.filename, "base": self.base}) + "\n")
+                f.write("\n".join(records) + "\n")
+        except OSError as e:
+            print(f"Warning: Could not write journal {self.path}: {e}")
+        return False
+
+    def replay(self):
+        """Apply the journal onto the freshly loaded buffer."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                ops = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            self.remove()
+            return False
+
+        # Edits made against another version of the file no longer apply
+        if header.get("base") != self.base or not ops:
+            self.remove()
+            return False
+
+        buff = self.buff
+        self.replaying = True
+        buff.begin_user_action()
+        try:
+            for kind, offset, arg in ops:
+                start = buff.get_iter_at_offset(offset)
+                if kind == "i":
+                    buff.insert(start, arg)
+                else:
+                    end = buff.get_iter_at_offset(offset + arg)
+                    buff.delete(start, end)
+        finally:
+            buff.end_user_action()
+            self.replaying = False
+        return True
+
+    def checkpoint(self):
+        """Flush, and return where the edits made from now on will start."""
+        self.flush()
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def compact(self, filename=None, since=None):
+        """
+        The buffer is on disk now, so start over with an empty journal.
+        Edits after the checkpoint since were made on top of what was
+        written, and are kept.
+        """
+        kept = self.read_since(since) if since is not None else []
+        self.pending = []
+        self.remove()
+        if filename and filename != self.filename:
+            self.filename = filename
+            self.path = journal_path(filename)
+            self.remove()
+        self.base = file_stamp(self.filename)
+        if kept:
+            self.pending = kept
+            self.schedule_flush()
+
+    def read_since(self, offset):
+        self.flush()
+        records = []
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    op = json.loads(line)
+                    # A journal begun after the checkpoint starts with a header
+                    if isinstance(op, list):
+                        records.append(op)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read journal {self.path}: {e}")
+        return records
+
+    def discard(self):
+        if self.timeout_id is not None:
+            glib.source_remove(self.timeout_id)
+            self.timeout_id = None
+        for handler in self.handlers:
+            self.buff.disconnect(handler)
+        self.handlers = []
+        self.pending = []
+        self.remove()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
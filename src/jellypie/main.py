@@ -21,7 +21,7 @@
 
 import os
 import sys
-from . import window
+from . import watcher, window
 from .helper import (
     gtk, gio, glib, gdk, gtksource, get_icon_dir, basedir
 )
@@ -37,6 +37,7 @@ class Application(gtk.Application):
         )
         self.windows = []
         self.open_files = {}
+        self.watcher = watcher.DirectoryWatcher()
 
         self.add_main_option(
             'test',
@@ -17,8 +17,7 @@
 
 
 import os
-import time
-from . import window
+from . import completions, compress, window
 from .helper import (
     gtk, gio, glib, gtksource, switchmenu, stylescheme, config, gdk,
     get_icon_dir, get_css_path, get_app_version)
@@ -513,6 +512,8 @@ class Menu():
             "save", self.on_save, shortcuts.get("save", "<Control>s"))
         self.create_action(
             "find", self.on_find, shortcuts.get("find", "<Control>f"))
+        self.create_action(
+            "replace", self.on_replace, shortcuts.get("replace", "<Control>r"))
         self.create_action(
             "go_to_line", self.on_go_to_line, shortcuts.get("go_to_line", "<Control>g"))
         self.create_action(
@@ -523,6 +524,10 @@ class Menu():
             "quit", self.on_quit, shortcuts.get("quit", "<Control>q"))
         self.create_action(
             "mark_done", self.on_mark_done, shortcuts.get("mark_done", "<Control>d"))
+        self.create_action(
+            "show_done", self.on_show_done, shortcuts.get("show_done", "<Control><Shift>d"))
+        self.create_action(
+            "history", self.on_history, shortcuts.get("history", "<Control><Shift>h"))
         self.create_action(
             "format_bold", self.on_format_bold, shortcuts.get("format_bold", "<Control>b"))
         self.create_action(
@@ -614,20 +619,25 @@ class Menu():
 
                 continue
 
+            if filename in tab.admin_files:
+                gfile = tab.admin_files[filename]
+            else:
+                gfile = gio.File.new_for_path(filename)
             try:
-                if filename in tab.admin_files:
-                    gfile = gio.File.new_for_uri(f"admin://{filename}")
+                # Compressed todo files are text once decompressed
+                if compress.codec_for(filename):
+                    mime_type = "text/plain"
                 else:
-                    gfile = gio.File.new_for_path(filename)
-                info = gfile.query_info(
-                    "standard::content-type",
-                    gio.FileQueryInfoFlags.NONE, None)
-                mime_type = info.get_content_type()
+                    info = gfile.query_info(
+                        "standard::content-type",
+                        gio.FileQueryInfoFlags.NONE, None)
+                    mime_type = info.get_content_type()
             except glib.Error:
                 mime_type = "text/plain"
 
             lang_man = gtksource.LanguageManager.get_default()
-            lang = lang_man.guess_language(filename, mime_type)
+            lang = lang_man.guess_language(
+                compress.plain_name(filename), mime_type)
             is_text = True
 
             if not lang and not mime_type.startswith("text"):
@@ -663,12 +673,8 @@ class Menu():
                     hbox = tab.get_current_tab()
 
                     if tab.monitors.get(tab.key) is None:
-                        monitor = gfile.monitor_file(
-                            gio.FileMonitorFlags.NONE, None)
-                        monitor.connect(
-                            "changed", self.file_changed,
-                            tab, tab.key, hbox)
-                        tab.monitors[tab.key] = monitor
+                        tab.monitors[tab.key] = self.app.watcher.watch(
+                            filename, self.file_changed, tab, tab.key, hbox)
 
                     self.app.register_file(
                         filename, self.app.get_active_window(), tab.key)
@@ -684,43 +690,44 @@ class Menu():
                     dialog.set_child(vbox)
                     dialog.present()
 
-    def file_changed(self, monitor, _file, otr_file, event_type, tab, key, hb):
-        if key not in tab.files:
-            return
-
-        if event_type not in {
-            gio.FileMonitorEvent.CHANGED,
-            gio.FileMonitorEvent.DELETED,
-            gio.FileMonitorEvent.RENAMED,
-        }:
-            return
-
-        last_saved = tab.recently_saved.get(key)
-        if last_saved and time.monotonic() - last_saved < 1.5:
-            return
-
-        if key in tab.file_event_timer:
+    def file_changed(self, tab, key, hb):
+        # Our own save records the new state when it completes
+        if key not in tab.files or key in tab.is_saving:
             return
 
         gfile = getattr(hb, "gfile", None)
         if gfile is None:
             return
 
-        ed = tab.get_active_editor(hb)
+        # Touched, or rewritten with the same contents, is not a change
+        tab.disk_changed(key, tab.files[key],
+                         lambda: self.on_disk_changed(tab, key, hb, gfile))
 
-        def delayed_handler():
-            del tab.file_event_timer[key]
-            exists = gfile.query_exists(None)
-            event = "changed" if exists else "removed"
+    def on_disk_changed(self, tab, key, hb, gfile):
+        if key not in tab.files or key in tab.is_saving:
+            return
 
-            if key == tab.key:
-                self.handle_file_change(event, gfile, tab, key, ed)
-            else:
-                tab.pending_reload[key] = event
-            return False
+        ed = tab.get_active_editor(hb)
+        if tab.defer_while_replacing(
+                ed.get_buffer(),
+                lambda: self.on_disk_changed(tab, key, hb, gfile)):
+            return
+        exists = gfile.query_exists(None)
+        event = "changed" if exists else "removed"
 
-        timeout_id = glib.timeout_add(300, delayed_handler)
-        tab.file_event_timer[key] = timeout_id
+        if event == "changed":
+            modified = ed.get_buffer().get_modified()
+            # Nothing to lose, and undo brings the old text back
+            if not modified and config.get_config("auto_reload"):
+                tab.reload_file(key, gfile)
+                return
+            if modified and tab.merge_file(key, gfile):
+                return
+
+        if key == tab.key:
+            self.handle_file_change(event, gfile, tab, key, ed)
+        else:
+            tab.pending_reload[key] = event
 
     def handle_file_change(self, event, gfile, tab, key, editor):
         basename = gfile.get_basename()
@@ -729,15 +736,7 @@ class Menu():
             def handler(button):
                 dialog.close()
                 if default_btn == "Reload":
-                    try:
-                        success, contents, etag = gfile.load_contents(None)
-                        text = contents.decode("utf-8", errors="replace")
-                        editor = tab.editor_instance[key]
-                        buff = editor.get_buffer()
-                        buff.set_text(text)
-                        buff.set_modified(False)
-                    except Exception:
-                        pass
+                    tab.reload_file(key, gfile)
                 elif default_btn == "Save As":
                     editor = tab.editor_instance[key]
                     tab.save_as_file(editor, key, basename, self.on_save_done)
@@ -807,8 +806,14 @@ class Menu():
     def on_find(self, action, param):
         self.show_find_replace()
 
-    def show_find_replace(self):
+    def on_replace(self, action, param):
+        self.show_find_replace(replace=True)
+
+    def show_find_replace(self, replace=False):
         tab = self.get_tab()
+        if replace and tab.key in tab.viewers:
+            replace = False
+        self.navbar.replace_revealer.set_reveal_child(replace)
         tab.findbar_visible[tab.key] = True
         tab.gtlbar_visible[tab.key] = False
 
@@ -819,6 +824,8 @@ class Menu():
         except Exception:
             pass
 
+        tab.schedule_highlight(tab.key)
+
         self.find_revealer.set_reveal_child(True)
         self.gtl_revealer.set_reveal_child(False)
         self.navbar.search_entry.grab_focus()
@@ -964,7 +971,7 @@ class Menu():
 
         tab = self.get_tab()
         editor = tab.value
-        if not editor:
+        if not editor or not editor.get_editable():
             return
 
         buff = editor.get_buffer()
@@ -995,7 +1002,8 @@ class Menu():
 
         # Create marked line with checkmark and timestamp
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        marked_line = f"✓ {line_text} [{timestamp}]"
+        marked_line = completions.marked_line(line_text, timestamp)
+        was_modified = buff.get_modified()
 
         # Begin user action for undo grouping
         buff.begin_user_action()
@@ -1031,6 +1039,15 @@ class Menu():
 
         buff.end_user_action()
 
+        if config.get_config("completion_log"):
+            tab.log_completion(tab.key, line_text, timestamp, was_modified)
+
+    def on_show_done(self, action, param):
+        self.get_tab().show_done_items()
+
+    def on_history(self, action, param):
+        self.get_tab().show_history()
+
     def on_format_bold(self, action, param):
         """Wrap selection with **text** for bold formatting"""
         self._apply_formatting("**", "**")
@@ -1047,7 +1064,7 @@ class Menu():
         """Apply formatting markers around selected text or at cursor"""
         tab = self.get_tab()
         editor = tab.value
-        if not editor:
+        if not editor or not editor.get_editable():
             return
 
         buff = editor.get_buffer()
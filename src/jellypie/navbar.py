@@ -72,11 +72,41 @@ class NavBar():
         find_hbox.append(self.regex_btn)
         find_hbox.append(self.close_btn)
 
+        self.replace_entry = gtk.Entry()
+        self.replace_entry.set_placeholder_text("Replace")
+        self.replace_entry.set_icon_from_icon_name(
+            gtk.EntryIconPosition.PRIMARY, "edit-find-replace-symbolic")
+        self.replace_entry.get_style_context().add_class("search")
+        self.replace_entry.set_hexpand(True)
+
+        self.replace_btn = gtk.Button(label="Replace")
+        self.replace_btn.set_tooltip_text("Replace Match and Find Next")
+        self.replace_all_btn = gtk.Button(label="Replace All")
+        self.replace_all_btn.set_tooltip_text("Preview and Replace All")
+        self.replace_all_btn.get_style_context().add_class("suggested-action")
+
+        replace_hbox = gtk.Box(
+            orientation=gtk.Orientation.HORIZONTAL, spacing=6)
+        replace_hbox.set_halign(gtk.Align.CENTER)
+        replace_hbox.set_valign(gtk.Align.CENTER)
+        replace_hbox.set_hexpand(True)
+        replace_hbox.append(self.replace_entry)
+        replace_hbox.append(self.replace_btn)
+        replace_hbox.append(self.replace_all_btn)
+
+        self.replace_revealer = gtk.Revealer()
+        self.replace_revealer.set_transition_type(
+            gtk.RevealerTransitionType.SLIDE_DOWN)
+        self.replace_revealer.set_transition_duration(150)
+        self.replace_revealer.set_reveal_child(False)
+        self.replace_revealer.set_child(replace_hbox)
+
         box = gtk.Box(orientation=gtk.Orientation.VERTICAL, spacing=4)
         box.set_hexpand(True)
         box.set_halign(gtk.Align.FILL)
         box.get_style_context().add_class("find-bar-wrapper")
         box.append(find_hbox)
+        box.append(self.replace_revealer)
 
         self.find_revealer = gtk.Revealer()
         self.find_revealer.set_transition_type(
@@ -16,18 +16,54 @@
 # with Jollpi. if not, see <https://www.gnu.org/licenses/>.
 
 
+import codecs
+import functools
+import mmap
 import os
 import re
 import time
 import gc
+import threading
+import zlib
+from . import archive
+from . import completions
+from . import compress
+from . import diffutil
+from . import done
+from . import durable
 from . import editor
+from . import history
+from . import journal
 from . import minimap
+from . import replace
+from . import replica
+from . import search
+from . import viewer
 from .helper import (
-    gtk, gdk, gio, glib, gtksource, config, get_css_path, TabRow)
+    gtk, gdk, gio, glib, gtksource, config, get_css_path, TabRow,
+    content_digest, text_bytes)
 
 EDIT_ICON = "document-edit-symbolic"
 SAVE_ICON = "document-save-symbolic"
 
+# Seconds a synchronous load may block, and per idle slice of a
+# progressive load
+SYNC_LOAD_BUDGET = 0.05
+LOAD_SLICE = 0.008
+LOAD_CHUNK = 64 * 1024
+
+# Milliseconds of quiet typing before the search result label catches up,
+# or a background scan starts for a changed query
+SEARCH_REFRESH_DELAY = 150
+# Buffers above this many characters are searched on a worker thread when
+# search_engine is "auto", and only matches this many lines around the
+# viewport are highlighted
+THREADED_SEARCH_SIZE = 1024 * 1024
+HIGHLIGHT_MARGIN = 50
+MATCH_TAG = "engine-search-match"
+# Seconds of replacing per idle slice of a replace-all
+REPLACE_SLICE = 0.008
+
 PLAIN_WHITELIST = [
     "text/csv",
     "text/tab-separated-values",
@@ -73,6 +109,12 @@ class Notebook(gtk.Notebook):
 
         self.navbar.close_btn.connect("clicked", self.close_findbar)
 
+        self.navbar.replace_entry.connect(
+            "activate", lambda entry: self.on_replace_clicked(None))
+        self.navbar.replace_btn.connect("clicked", self.on_replace_clicked)
+        self.navbar.replace_all_btn.connect(
+            "clicked", self.on_replace_all_clicked)
+
         self.navbar.gtl_entry.connect(
             "activate", lambda entry: self.go_to_line())
         self.navbar.gtl_btn.connect("clicked", lambda entry: self.go_to_line())
@@ -88,7 +130,8 @@ class Notebook(gtk.Notebook):
         self.set_scrollable(True)
         self.set_show_tabs(False)
 
-        self.admin_files = set()
+        self.admin_files = {}
+        self.admin_mount = None
         self.editor_instance = {}
         self.files = {}
         self.unsave = {}
@@ -107,15 +150,33 @@ class Notebook(gtk.Notebook):
 
         self.search_context = {}
         self.search_error = {}
+        self.applied_search = {}
+        self.search_refresh_timeout = {}
+        self.search_results = {}
+        self.pending_find = {}
+        self.highlight_idle = {}
 
         self.gtlbar_visible = {}
         self.gtl_text = {}
 
         self.monitors = {}
         self.pending_reload = {}
-        self.recently_saved = {}
-        self.file_event_timer = {}
+        self.disk_state = {}
+        self.monitor_stats = {"suppressed": 0, "raised": 0}
         self.is_saving = {}
+        self.save_waiters = {}
+        self.save_queue = {}
+        self.saver_cancellable = {}
+        self.histories = {}
+        self.save_stats = {"writes_skipped": 0, "bytes_saved": 0}
+        self.journals = {}
+        self.pending_recovery = set()
+        self.archiver = archive.Archiver(self)
+        self.replica = replica.Replica(self)
+        self.insert_rate = 20 * 1024 * 1024
+        self.viewers = {}
+        self.perf_check_timer = {}
+        self.done_stores = {}
 
         self.mark_set_timeout = {}
 
@@ -161,13 +222,15 @@ class Notebook(gtk.Notebook):
             hbox = self.get_nth_page(page_num)
             self.close_tab(None, hbox)
 
-    def update_result_label(self, index, total):
+    def update_result_label(self, index, total, more=False):
+        # more: total only counts the matches found so far
+        total_text = f"{total}+" if more else f"{total}"
         if total <= 0:
             label_text = ""
         elif index < 0:
-            label_text = f"0 of {total}"
+            label_text = f"0 of {total_text}"
         else:
-            label_text = f"{index} of {total}"
+            label_text = f"{index} of {total_text}"
 
         if self.result_label.get(self.key) == label_text:
             return
@@ -188,10 +251,9 @@ class Notebook(gtk.Notebook):
 
     def is_match(self, pattern, text, use_regex):
         if use_regex:
-            try:
-                return re.fullmatch(pattern, text) is not None
-            except re.error:
-                return False
+            compiled = search.cached_pattern(pattern)
+            return compiled is not None and \
+                compiled.fullmatch(text) is not None
         return text == pattern
 
     def button_status(self, status):
@@ -211,6 +273,9 @@ class Notebook(gtk.Notebook):
         if not text or not self.value:
             self.update_result_label(-1, 0)
             self.search_error[self.key] = False
+            self.applied_search.pop(self.key, None)
+            self.search_results.pop(self.key, None)
+            self.schedule_highlight(self.key)
             self.context.set_highlight(False)
             self.context.get_settings().set_search_text(text)
             self.set_search_error_state(False)
@@ -223,16 +288,35 @@ class Notebook(gtk.Notebook):
         use_regex = self.use_regex.get(self.key, False)
         whole_word = self.whole_word.get(self.key, False)
 
-        settings.set_case_sensitive(case_active)
-        settings.set_wrap_around(True)
-
         if use_regex:
             pattern = r"\b(?:{})\b".format(text) if whole_word else text
-            settings.set_regex_enabled(True)
         else:
             pattern = r"\b" + re.escape(text) + r"\b" if whole_word else text
-            settings.set_regex_enabled(whole_word)
+        regex_enabled = use_regex or whole_word
+
+        # New settings restart the scan of the whole buffer
+        threaded = self.wants_threaded_search()
+        applied = (pattern, case_active, regex_enabled, threaded)
+        if self.applied_search.get(self.key) == applied:
+            return
+        self.applied_search[self.key] = applied
+
+        if threaded:
+            self.context.set_highlight(False)
+            settings.set_search_text(None)
+            # The matches of the old query must not be taken for the new one
+            self.search_results.pop(self.key, None)
+            self.schedule_highlight(self.key)
+            # A scan per keystroke would mostly be cancelled unseen
+            self.reset_cancellable()
+            self.schedule_search_refresh(self.key)
+            return
 
+        self.search_results.pop(self.key, None)
+        self.schedule_highlight(self.key)
+        settings.set_case_sensitive(case_active)
+        settings.set_wrap_around(True)
+        settings.set_regex_enabled(regex_enabled)
         settings.set_search_text(pattern)
         self.context.set_highlight(True)
 
@@ -246,6 +330,11 @@ class Notebook(gtk.Notebook):
         if getattr(buff, "_is_loading", False):
             return
 
+        # Counts of a viewer's window would be misleading
+        if getattr(buff, "_is_viewer", False):
+            self.button_status(True)
+            return
+
         count = context.get_occurrences_count()
         if count < 0:
             return
@@ -286,6 +375,185 @@ class Notebook(gtk.Notebook):
 
         glib.idle_add(update_ui, priority=glib.PRIORITY_HIGH_IDLE)
 
+    def threaded_search(self):
+        """Whether the current query runs on the background engine."""
+        applied = self.applied_search.get(self.key)
+        return bool(applied and applied[3])
+
+    def wants_threaded_search(self):
+        engine = config.get_config("search_engine")
+        if engine == "sourceview" or self.key in self.viewers:
+            return False
+        if engine == "auto":
+            # The search context has no time limit, so a regex goes to the
+            # child process whatever the size; plain text in a small buffer
+            # is handled well enough by the search context
+            if self.use_regex.get(self.key, False) and \
+                    config.get_config("regex_time_budget"):
+                return True
+            buff = self.value.get_buffer()
+            return buff.get_char_count() > THREADED_SEARCH_SIZE
+        return True
+
+    def start_search_scan(self, key):
+        """Scan a copy of the buffer for the query on a worker thread."""
+        editor = self.editor_instance.get(key)
+        text = self.search_text.get(key)
+        if editor is None or not text:
+            return
+
+        use_regex = self.use_regex.get(key, False)
+        pattern = self.query_pattern(key)
+        if pattern is None:
+            self.search_failed(key)
+            return
+
+        buff = editor.get_buffer()
+        start, end = buff.get_bounds()
+        snapshot = buff.get_text(start, end, True)
+
+        if not hasattr(editor, "_match_scroll_id"):
+            editor._match_scroll_id = editor.get_vadjustment().connect(
+                "value-changed", lambda adj: self.schedule_highlight(key))
+
+        def on_scanned(result):
+            self.search_results[key] = result
+            self.schedule_highlight(key)
+            if key != self.key:
+                return
+            self.show_search_result(key)
+            if result.complete and key in self.pending_find:
+                self.engine_find(self.pending_find.pop(key))
+
+        def on_slow():
+            self.search_failed(key, "Too slow")
+
+        self.reset_cancellable()
+        budget = config.get_config("regex_time_budget")
+        if use_regex and budget:
+            search.scan_budgeted(snapshot, pattern, self.search_cancellable,
+                                 on_scanned, budget, on_slow)
+        else:
+            search.scan_async(snapshot, pattern, self.search_cancellable,
+                              on_scanned)
+
+    def search_failed(self, key, reason=""):
+        self.search_results.pop(key, None)
+        self.pending_find.pop(key, None)
+        self.search_error[key] = True
+        self.schedule_highlight(key)
+        if key != self.key:
+            self.result_label[key] = reason
+            return
+        self.set_search_error_state(True)
+        self.button_status(False)
+        self.navbar.result_label.set_text(reason)
+        self.result_label[key] = reason
+
+    def show_search_result(self, key):
+        result = self.search_results.get(key)
+        if result is None:
+            return
+
+        count = len(result)
+        self.search_error[key] = count == 0
+        self.set_search_error_state(count == 0)
+        self.button_status(count > 0)
+        if count == 0:
+            self.update_result_label(-1, 0)
+            return
+
+        buff = self.editor_instance[key].get_buffer()
+        if buff.get_has_selection():
+            start, end = buff.get_selection_bounds()
+            pos = result.position(start.get_offset(), end.get_offset())
+        else:
+            pos = 0
+        self.update_result_label(pos, count, not result.complete)
+
+    def engine_find(self, forward):
+        key = self.key
+        result = self.search_results.get(key)
+        if result is None:
+            # Edited since the last scan; move once the new one is in
+            self.pending_find[key] = forward
+            self.start_search_scan(key)
+            return
+        if not result:
+            return
+
+        buff = self.value.get_buffer()
+        if buff.get_has_selection():
+            start, end = buff.get_selection_bounds()
+        else:
+            start = end = buff.get_iter_at_mark(buff.get_insert())
+        start, end = start.get_offset(), end.get_offset()
+        index = (result.next_index(start, end) if forward
+                 else result.prev_index(start, end))
+
+        # Wrapping around needs the matches the count has not reached yet
+        wrapped = (result.starts[index] < end if forward
+                   else result.starts[index] >= start)
+        if wrapped and not result.complete:
+            self.pending_find[key] = forward
+            return
+
+        match_start = buff.get_iter_at_offset(result.starts[index])
+        match_end = buff.get_iter_at_offset(result.ends[index])
+        self._is_selecting = True
+        buff.select_range(match_start, match_end)
+        self.value.scroll_to_iter(match_start, 0.25, False, 0.0, 0.5)
+        glib.idle_add(lambda: setattr(self, '_is_selecting', False))
+        self.update_result_label(index + 1, len(result), not result.complete)
+
+    def match_tag(self, buff):
+        tag = buff.get_tag_table().lookup(MATCH_TAG)
+        if tag is None:
+            tag = buff.create_tag(
+                MATCH_TAG, background="#fce94f", foreground="#000000")
+            scheme = buff.get_style_scheme()
+            style = scheme.get_style("search-match") if scheme else None
+            if style:
+                style.apply(tag)
+        return tag
+
+    def schedule_highlight(self, key):
+        if key not in self.highlight_idle:
+            self.highlight_idle[key] = glib.idle_add(
+                self.highlight_matches, key)
+
+    def highlight_matches(self, key):
+        """Tag the matches in and around the viewport, and only those."""
+        self.highlight_idle.pop(key, None)
+        editor = self.editor_instance.get(key)
+        if editor is None:
+            return False
+
+        buff = editor.get_buffer()
+        result = self.search_results.get(key)
+        if getattr(buff, "_has_match_tags", False):
+            start, end = buff.get_bounds()
+            buff.remove_tag(self.match_tag(buff), start, end)
+            buff._has_match_tags = False
+        if not result or not self.findbar_visible.get(key, False):
+            return False
+
+        rect = editor.get_visible_rect()
+        top, _ = editor.get_line_at_y(rect.y)
+        bottom, _ = editor.get_line_at_y(rect.y + rect.height)
+        _, low = buff.get_iter_at_line(
+            max(0, top.get_line() - HIGHLIGHT_MARGIN))
+        _, high = buff.get_iter_at_line(bottom.get_line() + HIGHLIGHT_MARGIN)
+
+        tag = self.match_tag(buff)
+        for i in result.between(low.get_offset(), high.get_offset()):
+            buff.apply_tag(
+                tag,
+                buff.get_iter_at_offset(result.starts[i]),
+                buff.get_iter_at_offset(result.ends[i]))
+        buff._has_match_tags = True
+        return False
+
     def reset_cancellable(self):
         if (
             hasattr(self, "search_cancellable") and
@@ -322,7 +590,80 @@ class Notebook(gtk.Notebook):
             self.set_search_error_state(True)
             self.update_result_label(-1, 0)
 
+    def viewer_pattern(self, text):
+        flags = re.MULTILINE
+        if not self.case_sensitive.get(self.key, False):
+            flags |= re.IGNORECASE
+
+        whole_word = self.whole_word.get(self.key, False)
+        if self.use_regex.get(self.key, False):
+            pattern = r"\b(?:{})\b".format(text) if whole_word else text
+        else:
+            pattern = re.escape(text)
+            pattern = r"\b" + pattern + r"\b" if whole_word else pattern
+
+        try:
+            return re.compile(pattern.encode("utf-8"), flags)
+        except re.error:
+            return None
+
+    def viewer_find(self, forward):
+        text = self.search_text.get(self.key, "")
+        if not text:
+            return
+
+        key = self.key
+
+        def not_found(reason=""):
+            self.search_error[key] = True
+            self.set_search_error_state(True)
+            self.update_result_label(-1, 0)
+            if reason:
+                self.navbar.result_label.set_text(reason)
+                self.result_label[key] = reason
+
+        pattern = self.viewer_pattern(text)
+        if pattern is None:
+            not_found()
+            return
+
+        def on_found(found):
+            if key != self.key or key not in self.viewers:
+                return
+            if not found:
+                not_found()
+                return
+
+            self._is_selecting = True
+            line = self.viewers[key].select(*found)
+            glib.idle_add(lambda: setattr(self, '_is_selecting', False))
+
+            # Counting every match in the mapped file is not worth the
+            # scan, so report where the match is instead
+            self.search_error[key] = False
+            self.set_search_error_state(False)
+            label_text = f"line {line + 1}"
+            self.navbar.result_label.set_text(label_text)
+            self.result_label[key] = label_text
+
+        def on_slow():
+            if key == self.key:
+                not_found("Too slow")
+
+        self.reset_cancellable()
+        budget = config.get_config("regex_time_budget")
+        self.viewers[key].find_async(
+            pattern, forward, self.search_cancellable, on_found,
+            budget if self.use_regex.get(key, False) else None, on_slow)
+
     def on_next_clicked(self, btn):
+        if self.key in self.viewers:
+            self.viewer_find(True)
+            return
+        if self.threaded_search():
+            self.engine_find(True)
+            return
+
         buff = self.context.get_buffer()
 
         if buff.get_has_selection():
@@ -335,6 +676,13 @@ class Notebook(gtk.Notebook):
             end, self.search_cancellable, self.on_match, None)
 
     def on_prev_clicked(self, btn):
+        if self.key in self.viewers:
+            self.viewer_find(False)
+            return
+        if self.threaded_search():
+            self.engine_find(False)
+            return
+
         buff = self.context.get_buffer()
 
         if buff.get_has_selection():
@@ -373,83 +721,251 @@ class Notebook(gtk.Notebook):
 
         self.on_search_entry_changed(self.navbar.search_entry)
 
+    def query_pattern(self, key):
+        return search.compile_pattern(
+            self.search_text.get(key, ""),
+            self.case_sensitive.get(key, False),
+            self.whole_word.get(key, False),
+            self.use_regex.get(key, False))
+
+    def replace_template(self, key):
+        template = self.navbar.replace_entry.get_text()
+        if self.use_regex.get(key, False):
+            return template
+        return gtksource.utils_unescape_search_text(template)
+
     def on_replace_clicked(self, btn):
-        buff = self.context.get_buffer()
-        if not buff.get_has_selection():
+        key = self.key
+        if key is None or key in self.viewers or not self.search_text.get(key):
             return
 
-        start, end = buff.get_selection_bounds()
-        replace_text = self.navbar.replace_entry.get_text()
-        unescaped_replace = gtksource.utils_unescape_search_text(replace_text)
-
-        try:
-            success = self.context.replace(start, end, unescaped_replace, -1)
-            if not success:
-                return
-        except glib.Error:
+        pattern = self.query_pattern(key)
+        if pattern is None:
+            self.search_failed(key)
             return
 
+        buff = self.value.get_buffer()
+        if buff.get_has_selection():
+            start, end = buff.get_selection_bounds()
+            match = pattern.fullmatch(buff.get_text(start, end, True))
+            if match:
+                try:
+                    text = replace.expand(
+                        match, self.replace_template(key),
+                        self.use_regex.get(key, False))
+                except (re.error, IndexError):
+                    self.set_search_error_state(True)
+                    self.navbar.result_label.set_text("Bad replacement")
+                    return
+                buff.begin_user_action()
+                buff.delete(start, end)
+                buff.insert(start, text)
+                buff.end_user_action()
+
         self.on_next_clicked(None)
 
-        def update_after_replace():
-            count = self.context.get_occurrences_count()
-            if count < 0:
-                return True
+    def on_replace_all_clicked(self, btn):
+        key = self.key
+        if key is None or key in self.viewers or not self.search_text.get(key):
+            return
 
-            if buff.get_has_selection():
-                try:
-                    start, end = buff.get_selection_bounds()
-                    pos = self.context.get_occurrence_position(start, end)
-                    if pos != -1:
-                        self.update_result_label(pos, count)
-                        self.navbar.replace_btn.set_sensitive(True)
-                    else:
-                        self.update_result_label(0, count)
-                        self.navbar.replace_btn.set_sensitive(False)
-                except (ValueError, glib.Error):
-                    self.update_result_label(0, count)
-                    self.navbar.replace_btn.set_sensitive(False)
-            else:
-                self.update_result_label(0, count)
-                self.navbar.replace_btn.set_sensitive(False)
-            return False
+        pattern = self.query_pattern(key)
+        if pattern is None:
+            self.search_failed(key)
+            return
+
+        buff = self.value.get_buffer()
+        start, end = buff.get_bounds()
+        snapshot = buff.get_text(start, end, True)
+        # Only a finished scan for this very query has the right offsets
+        result = self.search_results.get(key)
+        known = result.starts if result is not None and result.complete \
+            and result.pattern == pattern else None
+        use_regex = self.use_regex.get(key, False)
+        cancellable = gio.Cancellable()
+        plans = []
 
-        glib.timeout_add(300, update_after_replace)
+        dialog, vbox = self.action_message(
+            self.app.get_active_window(), "Replace All", "Finding matches…")
+        detail = vbox.get_last_child()
 
-    def on_replace_all_clicked(self, btn):
-        replace_text = self.navbar.replace_entry.get_text()
+        def bind_item(factory, list_item):
+            list_item.get_child().set_text(list_item.get_item().get_string())
 
-        unescaped_replace = gtksource.utils_unescape_search_text(replace_text)
+        factory = gtk.SignalListItemFactory()
+        factory.connect(
+            "setup", lambda f, item: item.set_child(gtk.Label(xalign=0)))
+        factory.connect("bind", bind_item)
 
-        def do_replace_all():
-            try:
-                buff = self.context.get_buffer()
-                buff.handler_block_by_func(self.on_buffer_changed)
-                count = self.context.get_occurrences_count()
-                if count < 0:
-                    return True
+        listview = gtk.ListView(factory=factory)
+        scroller = gtk.ScrolledWindow()
+        scroller.set_policy(
+            gtk.PolicyType.AUTOMATIC, gtk.PolicyType.AUTOMATIC)
+        scroller.set_min_content_width(560)
+        scroller.set_min_content_height(300)
+        scroller.set_child(listview)
+        vbox.append(scroller)
+
+        progress = gtk.ProgressBar()
+        progress.set_visible(False)
+        vbox.append(progress)
+
+        def on_cancel(btn):
+            cancellable.cancel()
+            dialog.close()
+
+        def on_planned(plan):
+            plans.append(plan)
+            count = len(plan)
+            detail.set_text(
+                f"{count:,} replacement{'' if count == 1 else 's'}"
+                if count else "No matches")
+            # Rows are formatted only as they scroll into view
+            listview.set_model(
+                gtk.NoSelection(model=replace.PreviewModel(plan)))
+            btn_replace.set_sensitive(count > 0)
+
+        def on_error(message):
+            detail.set_text(message)
+
+        def on_finished(done, reason=""):
+            if reason:
+                detail.set_text(reason)
+                progress.set_visible(False)
+                return
+            dialog.close()
 
-                if count == 0:
-                    self.update_result_label(-1, 0)
-                    return False
+        def on_replace(btn):
+            btn_replace.set_sensitive(False)
+            progress.set_visible(True)
+            self.apply_replace_plan(
+                key, plans[0], cancellable, progress.set_fraction,
+                on_finished)
 
-                buff.begin_user_action()
-                self.context.replace_all(unescaped_replace, -1)
-                buff.end_user_action()
+        btn_box = gtk.Box(orientation=gtk.Orientation.HORIZONTAL, spacing=12)
+        btn_box.set_homogeneous(True)
+        btn_cancel = gtk.Button(label="Cancel")
+        btn_cancel.add_css_class("btn")
+        btn_cancel.connect("clicked", on_cancel)
+        btn_box.append(btn_cancel)
+        btn_replace = gtk.Button(label="Replace All")
+        btn_replace.get_style_context().add_class("suggested-action")
+        btn_replace.set_sensitive(False)
+        btn_replace.connect("clicked", on_replace)
+        btn_box.append(btn_replace)
+        vbox.append(btn_box)
+
+        dialog.set_child(vbox)
+        dialog.present()
 
-                self.navbar.replace_btn.set_sensitive(False)
-                self.navbar.replace_all_btn.set_sensitive(False)
+        replace.plan_async(
+            snapshot, pattern, self.replace_template(key), use_regex,
+            cancellable, on_planned, on_error, known,
+            config.get_config("regex_time_budget") if use_regex else None)
 
-            except glib.Error:
-                self.update_result_label(0, 0)
-                self.navbar.replace_btn.set_sensitive(False)
-                self.navbar.replace_all_btn.set_sensitive(False)
-            finally:
-                buff.handler_unblock_by_func(self.on_buffer_changed)
+    def defer_while_replacing(self, buff, callback):
+        """
+        Whether a Replace All is running in buff. If so, callback() runs
+        once it is over, so an edit made meanwhile stays out of its undo
+        group and out of what Cancel takes back.
+        """
+        deferred = getattr(buff, "_after_replace", None)
+        if deferred is not None:
+            deferred.append(callback)
+        return deferred is not None
+
+    def apply_replace_plan(self, key, plan, cancellable, on_progress,
+                           on_finished):
+        """
+        Make every substitution in plan as one user action, last to first
+        so the earlier offsets stay valid, a time slice per idle callback.
+        Cancelling undoes what was done so far. Typing in between stops the
+        run where it is, since undoing would take the typing with it.
+        """
+        editor = self.editor_instance.get(key)
+        if editor is None:
+            on_finished(False)
+            return
+
+        buff = editor.get_buffer()
+        if buff.get_char_count() != len(plan.text):
+            on_finished(False, "The text changed; run Replace All again")
+            return
+
+        state = {"index": len(plan), "made": 0, "stale": False,
+                 "typed": False, "changes": getattr(buff, "_change_count", 0)}
+        # Counting matches while the text is rewritten would only be redone
+        self.search_context[key].get_settings().set_search_text(None)
+        self.applied_search.pop(key, None)
+        buff.begin_user_action()
+        buff._after_replace = []
+
+        def finish(done):
+            buff.end_user_action()
+            deferred, buff._after_replace = buff._after_replace, None
+            if getattr(buff, "_closed", False):
+                on_finished(False)
+                return
+
+            if not done and not state["typed"] and state["made"]:
+                # Leave the text as it was rather than half replaced
+                self.block_signal = True
+                try:
+                    buff.undo()
+                finally:
+                    self.block_signal = False
+            for callback in deferred:
+                glib.idle_add(callback)
+
+            self.search_results.pop(key, None)
+            if key == self.key:
                 self.on_search_entry_changed(self.navbar.search_entry)
+                self.update_statusbar_cursor_info()
+            if state["stale"]:
+                on_finished(False, "The text changed; run Replace All again")
+            else:
+                on_finished(done)
+
+        def step():
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                finish(False)
+                return False
+            if getattr(buff, "_change_count", 0) != state["changes"]:
+                state["typed"] = state["stale"] = True
+                finish(False)
+                return False
+
+            deadline = time.monotonic() + REPLACE_SLICE
+            index = state["index"]
+            self.block_signal = True
+            try:
+                while index > 0 and time.monotonic() < deadline:
+                    index -= 1
+                    start = buff.get_iter_at_offset(plan.starts[index])
+                    end = buff.get_iter_at_offset(plan.ends[index])
+                    expected = plan.text[plan.starts[index]:plan.ends[index]]
+                    if buff.get_text(start, end, True) != expected:
+                        state["stale"] = True
+                        break
+                    buff.delete(start, end)
+                    buff.insert(start, plan.texts[index])
+                    state["made"] += 1
+            finally:
+                self.block_signal = False
+
+            state["index"] = index
+            state["changes"] = getattr(buff, "_change_count", 0)
+            if state["stale"]:
+                finish(False)
+                return False
+
+            on_progress(1 - index / len(plan))
+            if index:
+                return True
+            finish(True)
             return False
 
-        do_replace_all()
+        glib.idle_add(step)
 
     def go_to_line(self):
         line_text = self.navbar.gtl_entry.get_text().strip()
@@ -462,6 +978,12 @@ class Notebook(gtk.Notebook):
 
         self.gtl_text[self.key] = str(line_num + 1)
 
+        if self.key in self.viewers:
+            self.close_gtlbar()
+            self.viewers[self.key].go_to_line(line_num)
+            self.value.grab_focus()
+            return
+
         buff = self.value.get_buffer()
         max_line = buff.get_line_count() - 1
         line_num = min(line_num, max_line)
@@ -483,6 +1005,7 @@ class Notebook(gtk.Notebook):
 
         self.find_revealer.set_reveal_child(False)
         self.findbar_visible[self.key] = False
+        self.schedule_highlight(self.key)
         editor = self.get_active_editor(self.get_current_tab())
         editor.grab_focus()
 
@@ -598,6 +1121,12 @@ class Notebook(gtk.Notebook):
             self.value = editor
             self.context = context
 
+            # Matches dropped by a reload or merge while in the background
+            if self.findbar_visible.get(key, False) and \
+                    self.search_text.get(key) and \
+                    key not in self.search_results and self.threaded_search():
+                self.start_search_scan(key)
+
             box = self.get_tab_label(child)
             icon = box.get_first_child()
             tab_label = icon.get_next_sibling()
@@ -612,6 +1141,8 @@ class Notebook(gtk.Notebook):
             ):
                 w.set_sensitive(not loading)
 
+            self.statusbar.show_performance_mode(editor.performance_mode)
+
             if loading:
                 self.update_window_title(label)
             else:
@@ -631,6 +1162,8 @@ class Notebook(gtk.Notebook):
                 "modified_changed",
                 self.on_buffer_modified_changed, icon, label, self.key)
             buff.connect("changed", self.on_buffer_changed)
+            buff.connect_after("undo", self.on_buffer_undo)
+            buff.connect_after("redo", self.on_buffer_undo)
             buff.connect("mark_set", self.on_buffer_mark_set)
             buff._connected_signals = True
 
@@ -670,16 +1203,69 @@ class Notebook(gtk.Notebook):
             icon.set_from_icon_name(EDIT_ICON)
 
     def on_buffer_changed(self, buff):
+        # Lets a save or a Replace All tell whether it was typed over
+        buff._change_count = getattr(buff, "_change_count", 0) + 1
         if getattr(buff, "_is_loading", False):
             return
 
+        # Offsets from before the edit no longer point at the matches, even
+        # for a reload or merge into a tab in the background
+        key = getattr(buff, "_tab_key", None)
+        stale = self.search_results.pop(key, None) is not None
         if self.block_signal or self.key is None:
+            if stale and self.findbar_visible.get(key, False):
+                self.schedule_search_refresh(key)
             return
 
         self.update_statusbar_cursor_info()
+        self.schedule_performance_check(self.key)
 
-        if self.findbar_visible.get(self.key, False):
-            self.on_search_entry_changed(self.navbar.search_entry)
+        if self.findbar_visible.get(key, False):
+            self.schedule_search_refresh(key)
+
+    def schedule_search_refresh(self, key):
+        # The search context rescans just the edited lines by itself; only
+        # the result label needs to catch up, once typing pauses. The
+        # background engine rescans its copy then
+        old_id = self.search_refresh_timeout.pop(key, None)
+        if old_id:
+            glib.source_remove(old_id)
+
+        def refresh():
+            self.search_refresh_timeout.pop(key, None)
+            if key != self.key or not self.search_text.get(key):
+                return False
+            if self.threaded_search():
+                self.start_search_scan(key)
+            else:
+                self.on_occurrences_notify(self.context, None)
+            return False
+
+        self.search_refresh_timeout[key] = glib.timeout_add(
+            SEARCH_REFRESH_DELAY, refresh)
+
+    def schedule_performance_check(self, key):
+        if key in self.perf_check_timer or key in self.viewers:
+            return
+
+        def check():
+            self.perf_check_timer.pop(key, None)
+            self.check_performance_mode(key)
+            return False
+
+        self.perf_check_timer[key] = glib.timeout_add(500, check)
+
+    def check_performance_mode(self, key):
+        view = self.editor_instance.get(key)
+        if view is None or key in self.viewers:
+            return
+
+        if not view.update_performance_mode():
+            view.scan_lines(lambda: self.check_performance_mode(key))
+            return
+
+        if key == self.key:
+            self.statusbar.show_performance_mode(view.performance_mode)
 
     def on_buffer_mark_set(self, buff, loc, mark):
         if not hasattr(self, 'key') or self.key is None:
@@ -693,6 +1279,9 @@ class Notebook(gtk.Notebook):
                 not buff.get_has_selection():
             return
 
+        if getattr(buff, "_is_viewer", False):
+            return
+
         context = self.context
 
         if not context:
@@ -710,6 +1299,10 @@ class Notebook(gtk.Notebook):
             if getattr(self, '_is_selecting', False):
                 return False
 
+            if self.threaded_search():
+                self.show_search_result(self.key)
+                return False
+
             count = context.get_occurrences_count()
 
             if not buff.get_has_selection():
@@ -743,7 +1336,10 @@ class Notebook(gtk.Notebook):
 
         mode = "OVR" if editor.get_overwrite() else "INS"
 
-        self.statusbar.show_line_col(buff, filetype, mode)
+        fv = self.viewers.get(self.key)
+        first_line = fv.first if fv else 0
+
+        self.statusbar.show_line_col(buff, filetype, mode, first_line)
 
     def action_message(self, win, lbl_main, lbl_detail):
         dialog = gtk.Window()
@@ -788,16 +1384,42 @@ class Notebook(gtk.Notebook):
     def get_current_tab(self):
         return self.get_nth_page(self.get_current_page())
 
-    def is_large_file(self, gfile):
+    def get_file_size(self, gfile):
         try:
             info = gfile.query_info(
                 "standard::size",
                 gio.FileQueryInfoFlags.NONE,
                 None
             )
-            return info.get_size() > 2 * 1024 * 1024
+            return info.get_size()
         except glib.Error:
-            return False
+            return 0
+
+    def sync_load_limit(self):
+        # Largest file we expect to insert within one blocking budget,
+        # judged from how fast earlier loads went
+        limit = int(self.insert_rate * SYNC_LOAD_BUDGET)
+        return min(limit, self.large_file_threshold())
+
+    def large_file_threshold(self):
+        threshold = config.get_config("large_file_threshold")
+        return threshold if threshold else 2 * 1024 * 1024
+
+    def record_insert_rate(self, size, elapsed):
+        if elapsed < 0.001 or size <= 0:
+            return
+        self.insert_rate = 0.7 * self.insert_rate + 0.3 * (size / elapsed)
+
+    def load_mode(self, gfile):
+        size = self.get_file_size(gfile)
+        viewer_threshold = config.get_config("viewer_threshold")
+        if viewer_threshold and size > viewer_threshold and gfile.get_path():
+            return "viewer"
+        if size > self.large_file_threshold():
+            return "stream"
+        if size > self.sync_load_limit():
+            return "progressive"
+        return "direct"
 
     def new_tab(
         self, label, lang=None, tooltip=None,
@@ -811,6 +1433,7 @@ class Notebook(gtk.Notebook):
         view = editor.Editor()
 
         buff = view.get_buffer()
+        buff._tab_key = key
 
         settings = gtksource.SearchSettings()
         context = gtksource.SearchContext.new(buff, settings)
@@ -844,20 +1467,23 @@ class Notebook(gtk.Notebook):
         self.set_current_page(self.page_num(hbox))
 
         if tooltip and os.path.exists(tooltip):
-            if self.is_large_file(gfile):
+            mode = self.load_mode(gfile)
+            if compress.codec_for(tooltip):
+                self.compressed_insert_file(
+                    buff, gfile, key, lbl,
+                    self.get_language_for_buffer(lang, mimetype))
+            elif mode == "viewer":
+                self.viewers[key] = viewer.FileViewer(view, tooltip)
+            elif mode == "stream":
                 self.lazy_insert_file(
                     buff, gfile, lang, key, lbl, mimetype)
+            elif mode == "progressive":
+                self.progressive_insert_file(
+                    buff, gfile, lang, key, lbl, mimetype)
             else:
-                try:
-                    success, contents, _ = gfile.load_contents(None)
-                    if success:
-                        text = contents.decode("utf-8", "replace")
-                        buff.set_text(text)
-                        buff.set_language(self.get_language_for_buffer(lang, mimetype))
-                        buff.place_cursor(buff.get_start_iter())
-                        buff.set_modified(False)
-                except glib.Error:
-                    pass
+                self.direct_insert_file(
+                    buff, gfile, key, lbl,
+                    self.get_language_for_buffer(lang, mimetype))
 
         view.grab_focus()
 
@@ -865,69 +1491,752 @@ class Notebook(gtk.Notebook):
         self.value = self.editor_instance[key]
         self.context = self.search_context[key]
 
-    def lazy_insert_file(self, buff, gfile, lang, key, label, mt):
-        src_file = gtksource.File.new()
-        src_file.set_location(gfile)
-        loader = gtksource.FileLoader.new(buff, src_file)
-        cancellable = gio.Cancellable()
-        self.loader_cancellable[key] = cancellable
-
-        def widget_status(status):
-            for widget in (
-                self.navbar.search_entry,
-                self.navbar.gtl_entry,
-            ):
-                widget.set_sensitive(status)
+    def set_search_widgets_sensitive(self, status):
+        for widget in (
+            self.navbar.search_entry,
+            self.navbar.gtl_entry,
+        ):
+            widget.set_sensitive(status)
 
-        def buffer_commit_done():
-            if getattr(buff, "_closed", False):
-                return False
-            label.get_style_context().remove_class("moving-gradient")
-            buff._is_loading = False
-            buff._is_buffer_ready = True
-            buff.end_irreversible_action()
-            buff.set_highlight_syntax(True)
-            widget_status(True)
+    def begin_loading(self, buff, label):
+        buff.set_highlight_syntax(False)
+        buff.begin_irreversible_action()
+        buff._is_loading = True
+        self.set_search_widgets_sensitive(False)
+        label.get_style_context().add_class("moving-gradient")
 
-            glib.idle_add(
-                lambda: self.on_search_entry_changed(self.navbar.search_entry),
-                priority=glib.PRIORITY_HIGH_IDLE)
+    def end_loading(self, buff, key, label, filename):
+        if getattr(buff, "_closed", False):
             return False
+        label.get_style_context().remove_class("moving-gradient")
+        buff._is_loading = False
+        buff._is_buffer_ready = True
+        buff.end_irreversible_action()
+        self.set_search_widgets_sensitive(True)
+        self.on_file_loaded(key, buff, filename)
+
+        glib.idle_add(
+            lambda: self.on_search_entry_changed(self.navbar.search_entry),
+            priority=glib.PRIORITY_HIGH_IDLE)
+        return False
 
-        def on_loaded(loader, result, *args):
-            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
-                try:
-                    loader.load_finish(result)
-                except Exception:
-                    pass
-                return
+    def map_file(self, gfile):
+        # GBytes over an mmap of the file; nothing is copied into Python
+        path = gfile.get_path()
+        if path:
             try:
-                success = loader.load_finish(result)
-                if success:
-                    buff.set_language(self.get_language_for_buffer(lang, mt))
-                    buff.place_cursor(buff.get_start_iter())
-            except Exception:
+                return glib.MappedFile.new(path, False).get_bytes()
+            except glib.Error:
                 pass
-            finally:
-                self.loader_cancellable.pop(key, None)
-                glib.idle_add(buffer_commit_done,
-                              priority=glib.PRIORITY_HIGH_IDLE)
+        data, _ = gfile.load_bytes(None)
+        return data
 
-        buff.set_highlight_syntax(False)
-        buff.begin_irreversible_action()
-        buff._is_loading = True
-        widget_status(False)
-        label.get_style_context().add_class("moving-gradient")
+    def direct_insert_file(self, buff, gfile, key, label, language,
+                           stream=None, reload=False):
+        if stream is None and reload:
+            self.reread_file(buff, gfile, key, label, language)
+            return
 
-        loader.load_async(
-            glib.PRIORITY_LOW,
-            cancellable,
+        if stream is None:
+            try:
+                data = self.map_file(gfile)
+            except glib.Error as e:
+                self.show_load_error(key, buff, label, gfile.get_path(),
+                                     e.message)
+                return
+            # The loader validates UTF-8 and fills the buffer from the mapped
+            # bytes in C, so no decoded str is ever built
+            stream = gio.MemoryInputStream.new_from_bytes(data)
+
+        src_file = gtksource.File.new()
+        src_file.set_location(gfile)
+        loader = gtksource.FileLoader.new_from_stream(buff, src_file, stream)
+        loader.set_candidate_encodings([gtksource.Encoding.get_utf8()])
+        cancellable = gio.Cancellable()
+        self.loader_cancellable[key] = cancellable
+
+        def on_loaded(loader, result, *args):
+            error = None
+            try:
+                loader.load_finish(result)
+            except glib.Error as e:
+                # Invalid bytes were escaped, the text is still there
+                if e.code != gtksource.FileLoaderError.CONVERSION_FALLBACK:
+                    error = e
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                return
+
+            self.loader_cancellable.pop(key, None)
+            if error is not None:
+                self.show_load_error(key, buff, label, gfile.get_path(),
+                                     error.message)
+                return
+            buff._load_failed = False
+            self.editor_instance[key].set_editable(True)
+            buff.set_language(language)
+            buff.place_cursor(buff.get_start_iter())
+            buff.set_modified(False)
+            self.end_loading(buff, key, label, gfile.get_path())
+
+        self.begin_loading(buff, label)
+        loader.load_async(
+            glib.PRIORITY_DEFAULT,
+            cancellable,
             None,
             None,
             on_loaded,
             ()
         )
 
+    def reread_file(self, buff, gfile, key, label, language):
+        """Reload from a copy of the file rather than a mapping of it."""
+        # Another writer truncating the file would fault a mapping with
+        # SIGBUS, and a reload is exactly when one is at work
+        cancellable = gio.Cancellable()
+        self.loader_cancellable[key] = cancellable
+
+        def on_read(file, result, *args):
+            try:
+                data, _ = file.load_bytes_finish(result)
+            except glib.Error as e:
+                data, error = None, e
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                return
+            self.loader_cancellable.pop(key, None)
+            if data is None:
+                self.show_load_error(key, buff, label, gfile.get_path(),
+                                     error.message)
+                return
+            self.direct_insert_file(
+                buff, gfile, key, label, language,
+                gio.MemoryInputStream.new_from_bytes(data))
+
+        gfile.load_bytes_async(cancellable, on_read, None)
+
+    def show_load_error(self, key, buff, label, filename, text):
+        """Report a failed load and keep the tab from being saved over."""
+        if getattr(buff, "_is_loading", False):
+            label.get_style_context().remove_class("moving-gradient")
+            buff._is_loading = False
+            buff.end_irreversible_action()
+            self.set_search_widgets_sensitive(True)
+        # Saving what little was read would wipe out the file
+        buff._load_failed = True
+        buff.set_modified(False)
+        editor = self.editor_instance.get(key)
+        if editor is not None:
+            editor.set_editable(False)
+
+        print(f"Warning: Could not open {filename}: {text}")
+        dialog, vbox = self.action_message(
+            self.app.get_active_window(),
+            "Error",
+            f'Could not open file "{filename}"\n'
+            f"{text}")
+        menu = self.app.get_active_window().menu
+        btn_close = menu.make_button(dialog, "Close")
+        btn_close.get_style_context().add_class("suggested-action")
+        vbox.append(btn_close)
+        dialog.set_child(vbox)
+        dialog.present()
+
+    def compressed_insert_file(self, buff, gfile, key, label, language):
+        codec = compress.codec_for(gfile.get_path())
+        cancellable = gio.Cancellable()
+        self.loader_cancellable[key] = cancellable
+
+        def is_abandoned():
+            return cancellable.is_cancelled() or getattr(buff, "_closed", False)
+
+        def on_read(data, error):
+            if is_abandoned():
+                return
+            self.loader_cancellable.pop(key, None)
+            if error is not None:
+                self.show_load_error(key, buff, label, gfile.get_path(),
+                                     str(error))
+                return
+            self.direct_insert_file(
+                buff, gfile, key, label, language,
+                gio.MemoryInputStream.new_from_bytes(glib.Bytes.new(data)))
+
+        def on_opened(stream, error):
+            if is_abandoned():
+                return
+            if error is not None:
+                self.loader_cancellable.pop(key, None)
+                self.show_load_error(key, buff, label, gfile.get_path(),
+                                     error.message)
+            elif stream is not None:
+                # Decompressed by the converter as the loader reads; a
+                # corrupt member fails the load like any read error
+                self.loader_cancellable.pop(key, None)
+                self.direct_insert_file(
+                    buff, gfile, key, label, language, stream)
+            else:
+                compress.read_async(gfile, on_read, cancellable)
+
+        compress.open_stream_async(gfile, codec, on_opened, cancellable)
+
+    def reload_file(self, key, gfile):
+        if key in self.viewers:
+            self.viewers[key].reopen()
+            return
+
+        view = self.editor_instance.get(key)
+        if view is None:
+            return
+        buff = view.get_buffer()
+        if self.defer_while_replacing(
+                buff, lambda: self.reload_file(key, gfile)):
+            return
+        hbox = view.get_parent().get_parent()
+        label = self.get_tab_label(hbox).get_first_child().get_next_sibling()
+
+        def full_reload():
+            if compress.codec_for(gfile.get_path()):
+                self.compressed_insert_file(
+                    buff, gfile, key, label, buff.get_language())
+            else:
+                self.direct_insert_file(
+                    buff, gfile, key, label, buff.get_language(),
+                    reload=True)
+
+        if getattr(buff, "_is_loading", False):
+            full_reload()
+            return
+
+        # Closing the tab, or a newer reload, cancels the read
+        previous = self.loader_cancellable.get(key)
+        if previous:
+            previous.cancel()
+        cancellable = gio.Cancellable()
+        self.loader_cancellable[key] = cancellable
+
+        def on_read(contents, error):
+            if self.loader_cancellable.get(key) is cancellable:
+                del self.loader_cancellable[key]
+            if getattr(buff, "_closed", False):
+                return
+            try:
+                text = None if error else contents.decode("utf-8")
+            except UnicodeDecodeError:
+                text = None
+            if text is None:
+                full_reload()
+                return
+            if getattr(buff, "_is_loading", False):
+                return
+            self.apply_reload(key, buff, text, gfile.get_path())
+
+        compress.read_async(gfile, on_read, cancellable)
+
+    def merge_file(self, key, gfile):
+        """
+        Merge a change on disk into a buffer with unsaved edits. Returns
+        False when there is no base version to merge against.
+        """
+        view = self.editor_instance.get(key)
+        base = self.disk_state.get(key, [None] * 4)[3]
+        if view is None or base is None or key in self.viewers:
+            return False
+        buff = view.get_buffer()
+        if getattr(buff, "_is_loading", False):
+            return False
+        filename = gfile.get_path()
+
+        def merge(disk, ours, done_lines):
+            merged, conflicts = diffutil.merge3(
+                diffutil.split_lines(base),
+                diffutil.split_lines(ours),
+                diffutil.split_lines(disk))
+            glib.idle_add(
+                on_merged, disk, ours, done_lines, merged, conflicts)
+
+        def on_merged(disk, ours, done_lines, merged, conflicts):
+            if getattr(buff, "_closed", False):
+                return False
+            start, end = buff.get_bounds()
+            if buff.get_text(start, end, True) != ours:
+                # Typed into while merging; start over from the new text
+                start_merge(disk, done_lines)
+                return False
+            self.apply_merge(
+                key, buff, filename, disk, done_lines, merged, conflicts)
+            return False
+
+        def start_merge(disk, done_lines):
+            start, end = buff.get_bounds()
+            ours = buff.get_text(start, end, True)
+            threading.Thread(
+                target=merge, args=(disk, ours, done_lines),
+                daemon=True).start()
+
+        def on_read(contents, error):
+            if getattr(buff, "_closed", False):
+                return
+            try:
+                disk = None if error else contents.decode("utf-8")
+            except UnicodeDecodeError as e:
+                disk, error = None, e
+            if disk is None:
+                print(f"Warning: Could not merge {filename}: {error}")
+                return
+            done_lines = None
+            if self.hides_done_items(filename):
+                disk, done_lines = done.split_done_text(disk)
+            start_merge(disk, done_lines)
+
+        compress.read_async(gfile, on_read)
+        return True
+
+    def apply_merge(self, key, buff, filename, disk, done_lines, merged,
+                    conflicts):
+        theirs = diffutil.split_lines(disk)
+        if merged == theirs:
+            # Our edits were already on disk
+            self.apply_reload(key, buff, disk, filename, done_lines)
+            return
+
+        start, end = buff.get_bounds()
+        old = diffutil.split_lines(buff.get_text(start, end, True))
+        self.block_signal = True
+        try:
+            diffutil.apply_hunks(
+                buff, old, merged, diffutil.line_hunks(old, merged))
+        finally:
+            self.block_signal = False
+
+        self.record_disk_state(key, filename)
+        if done_lines is not None:
+            self.done_stores.pop(key, None)
+            if done_lines:
+                store = done.DoneStore()
+                store.lines = done_lines
+                self.done_stores[key] = store
+
+        # The journal now has to hold the edits on top of the new disk text
+        jnl = self.journals.get(key)
+        if jnl:
+            jnl.compact()
+            jnl.pending = diffutil.hunk_ops(
+                theirs, merged, diffutil.line_hunks(theirs, merged))
+            jnl.schedule_flush()
+
+        if key == self.key:
+            self.update_statusbar_cursor_info()
+            self.on_search_entry_changed(self.navbar.search_entry)
+
+        if conflicts:
+            dialog, vbox = self.action_message(
+                self.app.get_active_window(),
+                "Conflicting Changes",
+                f'"{os.path.basename(filename)}" was changed on disk while '
+                "you were editing it.\n"
+                f"{conflicts} conflicting change"
+                f"{'' if conflicts == 1 else 's'} "
+                "could not be merged and are marked in the text.")
+            menu = self.app.get_active_window().menu
+            btn_close = menu.make_button(dialog, "Close")
+            btn_close.get_style_context().add_class("suggested-action")
+            vbox.append(btn_close)
+            dialog.set_child(vbox)
+            dialog.present()
+
+    def apply_reload(self, key, buff, text, filename, done_lines=None):
+        """Bring the buffer in line with text by editing only what changed."""
+        if done_lines is None and self.hides_done_items(filename):
+            text, done_lines = done.split_done_text(text)
+
+        start, end = buff.get_bounds()
+        old = diffutil.split_lines(buff.get_text(start, end, True))
+        new = diffutil.split_lines(text)
+        hunks = diffutil.line_hunks(old, new)
+
+        if hunks:
+            self.block_signal = True
+            try:
+                diffutil.apply_hunks(buff, old, new, hunks)
+            finally:
+                self.block_signal = False
+        buff.set_modified(False)
+
+        self.on_file_loaded(key, buff, filename)
+        if done_lines:
+            store = done.DoneStore()
+            store.lines = done_lines
+            self.done_stores[key] = store
+
+        if key == self.key:
+            self.update_statusbar_cursor_info()
+            self.on_search_entry_changed(self.navbar.search_entry)
+
+    def progressive_insert_file(self, buff, gfile, lang, key, label, mt):
+        cancellable = gio.Cancellable()
+        self.loader_cancellable[key] = cancellable
+
+        def is_abandoned():
+            return cancellable.is_cancelled() or getattr(buff, "_closed", False)
+
+        def release(state):
+            if isinstance(state["source"], mmap.mmap):
+                state["source"].close()
+
+        def finish(state):
+            self.loader_cancellable.pop(key, None)
+            release(state)
+            # Timed end to end, idle highlighting between slices included,
+            # so the sync limit reflects what a highlighted buffer costs
+            if state["highlighted"]:
+                self.record_insert_rate(
+                    state["pos"], time.monotonic() - state["started"])
+            buff._load_failed = False
+            buff.place_cursor(buff.get_start_iter())
+            buff.set_modified(False)
+            self.end_loading(buff, key, label, gfile.get_path())
+
+        def insert_slice(state):
+            if is_abandoned():
+                release(state)
+                return False
+
+            source = state["source"]
+            size = len(source)
+            pos = state["pos"]
+            deadline = time.monotonic() + LOAD_SLICE
+
+            # Whole lines per insert keep each relayout small; returning to
+            # the main loop between slices lets the view paint right away
+            while pos < size and time.monotonic() < deadline:
+                stop = min(size, pos + LOAD_CHUNK)
+                if stop < size:
+                    newline = source.rfind(b"\n", pos, stop)
+                    if newline >= pos:
+                        stop = newline + 1
+                chunk = source[pos:stop]
+                if state["highlighted"] and \
+                        max(map(len, chunk.split(b"\n"))) > state["limit"]:
+                    buff.set_highlight_syntax(False)
+                    state["highlighted"] = False
+                buff.insert(buff.get_end_iter(), state["decoder"].decode(
+                    chunk, stop == size))
+                pos = stop
+            state["pos"] = pos
+
+            if pos < size:
+                return True
+
+            finish(state)
+            return False
+
+        def start(source):
+            buff.set_language(self.get_language_for_buffer(lang, mt))
+            state = {
+                "source": source,
+                "pos": 0,
+                "decoder": codecs.getincrementaldecoder("utf-8")("replace"),
+                "limit": config.get_config("long_line_limit"),
+                "highlighted": True,
+                "started": time.monotonic(),
+            }
+            buff.set_highlight_syntax(True)
+            glib.idle_add(insert_slice, state)
+
+        def on_read(file, result, *args):
+            try:
+                data, _ = file.load_bytes_finish(result)
+            except glib.Error as e:
+                if not is_abandoned():
+                    self.show_load_error(key, buff, label, gfile.get_path(),
+                                         e.message)
+                return
+            if not is_abandoned():
+                start(data.get_data())
+
+        self.begin_loading(buff, label)
+        path = gfile.get_path()
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                pass
+            else:
+                start(source)
+                return
+        gfile.load_bytes_async(cancellable, on_read, None)
+
+    def lazy_insert_file(self, buff, gfile, lang, key, label, mt):
+        src_file = gtksource.File.new()
+        src_file.set_location(gfile)
+        loader = gtksource.FileLoader.new(buff, src_file)
+        cancellable = gio.Cancellable()
+        self.loader_cancellable[key] = cancellable
+
+        def on_loaded(loader, result, *args):
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                try:
+                    loader.load_finish(result)
+                except Exception:
+                    pass
+                return
+            try:
+                success = loader.load_finish(result)
+                if success:
+                    buff.set_language(self.get_language_for_buffer(lang, mt))
+                    buff.place_cursor(buff.get_start_iter())
+            except Exception:
+                pass
+            finally:
+                self.loader_cancellable.pop(key, None)
+                glib.idle_add(self.end_loading, buff, key, label,
+                              gfile.get_path(),
+                              priority=glib.PRIORITY_HIGH_IDLE)
+
+        self.begin_loading(buff, label)
+
+        loader.load_async(
+            glib.PRIORITY_LOW,
+            cancellable,
+            None,
+            None,
+            on_loaded,
+            ()
+        )
+
+    def on_file_loaded(self, key, buff, filename):
+        self.record_disk_state(key, filename)
+        self.extract_done_items(key, buff, filename)
+        self.editor_instance[key].scan_lines(
+            lambda: self.check_performance_mode(key))
+        # The sync base is the file as on disk, so edits recovered below
+        # are logged to the other devices by the next save
+        self.replica.start(key, filename, self.file_bytes(key, buff))
+        if key in self.journals:
+            # Reloaded from disk, so earlier unsaved edits are gone
+            self.journals[key].compact()
+        else:
+            self.attach_journal(key, filename, buff)
+        self.replay_completions(key, buff, filename)
+        self.archiver.maybe_rotate(key, filename)
+
+    def record_disk_state(self, key, filename):
+        """
+        Remember the file's size and mtime, and off the loop its digest and
+        its text, the common ancestor for merging in changes made on disk.
+        The digest also lets a save of unchanged text skip the write.
+        """
+        try:
+            st = os.stat(filename)
+        except (OSError, TypeError):
+            self.disk_state.pop(key, None)
+            return
+
+        state = [st.st_size, st.st_mtime_ns, None, None]
+        self.disk_state[key] = state
+        if st.st_size > self.large_file_threshold():
+            return
+        codec = compress.codec_for(filename)
+        hides_done = self.hides_done_items(filename)
+
+        def hash_file():
+            try:
+                with open(filename, "rb") as f:
+                    data = f.read()
+                    after = os.fstat(f.fileno())
+            except OSError:
+                return
+            # Changed again while reading, so the digest is not for state
+            if (after.st_size, after.st_mtime_ns) != (state[0], state[1]):
+                return
+            state[2] = content_digest(data)
+            try:
+                text = compress.decompress(codec, data).decode("utf-8")
+            except Exception:
+                return
+            state[3] = done.split_done_text(text)[0] if hides_done else text
+
+        threading.Thread(target=hash_file, daemon=True).start()
+
+    def disk_changed(self, key, filename, on_changed):
+        """
+        Call on_changed() if a file monitor event means the contents really
+        changed: stat first, and hash, off the loop, only when the size
+        matches but the mtime moved.
+        """
+        known = self.disk_state.get(key)
+        try:
+            st = os.stat(filename)
+        except (OSError, TypeError):
+            known = None
+
+        def finish(changed):
+            # A save or another event has moved the state on since
+            if known is not None and \
+                    getattr(self, "disk_state", {}).get(key) is not known:
+                return False
+            if not changed:
+                known[1] = st.st_mtime_ns
+            elif known is not None:
+                # The file no longer holds what the buffer was saved as, but
+                # stays the base for merging until it is reloaded or merged
+                self.disk_state[key] = [
+                    st.st_size, st.st_mtime_ns, None, known[3]]
+
+            self.monitor_stats["raised" if changed else "suppressed"] += 1
+            if changed:
+                on_changed()
+            return False
+
+        if known is None:
+            finish(True)
+        elif (st.st_size, st.st_mtime_ns) == (known[0], known[1]):
+            finish(False)
+        elif st.st_size == known[0] and known[2] is not None:
+            digest = known[2]
+
+            def hash_file():
+                try:
+                    with open(filename, "rb") as f:
+                        changed = content_digest(f.read()) != digest
+                except OSError:
+                    changed = True
+                glib.idle_add(finish, changed)
+
+            threading.Thread(target=hash_file, daemon=True).start()
+        else:
+            finish(True)
+
+    def hides_done_items(self, filename):
+        return bool(config.get_config("hide_done_items")) and \
+            filename == config.get_filepath()
+
+    def extract_done_items(self, key, buff, filename):
+        self.done_stores.pop(key, None)
+        if not self.hides_done_items(filename):
+            return
+
+        store = done.DoneStore()
+        store.extract(buff)
+        if store:
+            self.done_stores[key] = store
+
+    def show_done_items(self):
+        store = self.done_stores.get(self.key)
+        count = len(store) if store else 0
+        dialog, vbox = self.action_message(
+            self.app.get_active_window(),
+            "Completed Items",
+            f"{count} completed item{'' if count == 1 else 's'} "
+            "hidden from the editor")
+
+        if store:
+            # Decoded only now; the ListView builds rows as they scroll in
+            model = gtk.StringList.new(
+                [line.decode("utf-8", "replace") for line in store.lines])
+
+            def bind_item(factory, list_item):
+                list_item.get_child().set_text(list_item.get_item().get_string())
+
+            factory = gtk.SignalListItemFactory()
+            factory.connect(
+                "setup", lambda f, item: item.set_child(gtk.Label(xalign=0)))
+            factory.connect("bind", bind_item)
+
+            listview = gtk.ListView(
+                model=gtk.NoSelection(model=model), factory=factory)
+            scroller = gtk.ScrolledWindow()
+            scroller.set_policy(
+                gtk.PolicyType.AUTOMATIC, gtk.PolicyType.AUTOMATIC)
+            scroller.set_min_content_width(500)
+            scroller.set_min_content_height(300)
+            scroller.set_child(listview)
+            vbox.append(scroller)
+
+        menu = self.app.get_active_window().menu
+        btn_close = menu.make_button(dialog, "Close")
+        btn_close.get_style_context().add_class("suggested-action")
+        vbox.append(btn_close)
+        dialog.set_child(vbox)
+        dialog.present()
+
+    def attach_journal(self, key, filename, buff):
+        if not filename or key in self.journals:
+            return
+        self.journals[key] = journal.Journal(filename, buff)
+        if key in self.pending_recovery:
+            self.recover_journal(key)
+
+    def recover_journal(self, key):
+        jnl = self.journals.get(key)
+        if jnl is None:
+            # Still loading; replay once the buffer is filled
+            self.pending_recovery.add(key)
+            return
+        self.pending_recovery.discard(key)
+        jnl.replay()
+
+    def log_completion(self, key, item, timestamp, was_modified):
+        """
+        Record a completion in the sidecar log instead of dirtying the file.
+        The buffer keeps the change; the next save writes it out.
+        """
+        filename = self.files.get(key)
+        editor = self.editor_instance.get(key)
+        if not filename or editor is None or key in self.is_saving:
+            return
+        log = completions.CompletionLog(filename)
+        if not log.append(item, timestamp):
+            return
+        buff = editor.get_buffer()
+        if not was_modified and self.log_covers(key, buff, log):
+            buff.set_modified(False)
+
+    def log_covers(self, key, buff, log):
+        """Whether the file plus the logged completions is the buffer."""
+        known = self.disk_state.get(key)
+        if known is None or known[3] is None:
+            return False
+        start, end = buff.get_bounds()
+        text = buff.get_text(start, end, False)
+        text += "\n" if not text.endswith("\n") else ""
+        return log.apply(known[3])[0] == text
+
+    def on_buffer_undo(self, buff):
+        """
+        Undo and redo move marked lines in and out of the buffer, so keep
+        only the logged completions it still holds.
+        """
+        key = getattr(buff, "_tab_key", None)
+        filename = self.files.get(key)
+        if not filename or not config.get_config("completion_log"):
+            return
+        # Checked even with no log left: a redo back to the point marked
+        # unmodified brings back a completion that is no longer logged
+        log = completions.CompletionLog(filename)
+        known = self.disk_state.get(key)
+        if not log.pending() and (known is None or known[3] is None):
+            return
+        start, end = buff.get_bounds()
+        log.retain(set(buff.get_text(start, end, False).split("\n")))
+        buff.set_modified(not self.log_covers(key, buff, log))
+
+    def replay_completions(self, key, buff, filename):
+        log = completions.CompletionLog(filename)
+        if not filename or not log.pending():
+            return
+        was_modified = buff.get_modified()
+        store = self.done_stores.get(key)
+        log.replay(buff, store.lines if store else ())
+        if not was_modified:
+            buff.set_modified(False)
+
+    def discard_journal(self, key):
+        self.pending_recovery.discard(key)
+        jnl = self.journals.pop(key, None)
+        if jnl:
+            jnl.discard()
+
     def create_tab_label(self, label, hbox, data, tooltip=None, icon=None):
         if tooltip.startswith("Untitled"):
             val = 0
@@ -976,10 +2285,16 @@ class Notebook(gtk.Notebook):
         tab_title = label_tab.get_text()
 
         def do_close():
-            cancellable = self.loader_cancellable.pop(data, None)
-            if cancellable:
-                cancellable.cancel()
-
+            for pending in (self.loader_cancellable, self.saver_cancellable):
+                cancellable = pending.pop(data, None)
+                if cancellable:
+                    cancellable.cancel()
+
+            self.discard_journal(data)
+            self.done_stores.pop(data, None)
+            fv = self.viewers.pop(data, None)
+            if fv:
+                fv.close()
             self.close_the_tab(child, data)
 
             monitor = self.monitors.pop(data, None)
@@ -1046,6 +2361,18 @@ class Notebook(gtk.Notebook):
 
         del self.editor_instance[data]
 
+        for timers in (
+            self.perf_check_timer,
+            self.search_refresh_timeout,
+            self.highlight_idle
+        ):
+            timeout_id = timers.pop(data, None)
+            if timeout_id:
+                glib.source_remove(timeout_id)
+
+        if self.replica.key == data:
+            self.replica.stop()
+
         for d in (
             self.unsave,
             self.findbar_visible,
@@ -1053,12 +2380,14 @@ class Notebook(gtk.Notebook):
             self.result_label,
             self.case_sensitive,
             self.search_error,
-            self.file_event_timer,
             self.whole_word,
             self.use_regex,
             self.search_context,
             self.gtlbar_visible,
-            self.gtl_text
+            self.gtl_text,
+            self.applied_search,
+            self.search_results,
+            self.pending_find
         ):
             d.pop(data, None)
 
@@ -1124,115 +2453,311 @@ class Notebook(gtk.Notebook):
         def after_file_chosen(dialog, result):
             try:
                 _file = dialog.save_finish(result)
-                self.save_the_file(_file.get_path(), editor, key)
-                on_done(True)
             except Exception:
                 on_done(False)
+                return
+            self.save_the_file(_file.get_path(), editor, key, on_done)
 
         dialog = gtk.FileDialog()
         dialog.set_initial_name(suggested_name)
         dialog.save(self.app.get_active_window(), None, after_file_chosen)
 
-    def save_the_file(self, filename, editor, key):
-        try:
-            if key in self.monitors:
-                self.monitors[key].cancel()
-                del self.monitors[key]
+    def buffer_bytes(self, buff):
+        start, end = buff.get_bounds()
+        return text_bytes(buff.get_text(start, end, False))
 
-            old_filename = self.files.get(key)
+    def file_bytes(self, key, buff):
+        return self.file_snapshot(key, buff)()
 
-            buff = editor.get_buffer()
-            start, end = buff.get_bounds()
-            text = buff.get_text(start, end, False)
+    def file_snapshot(self, key, buff):
+        """
+        Copy the text file_bytes would encode, and return a function that
+        encodes it, so that can run off the main loop.
+        """
+        store = self.done_stores.get(key)
+        if store:
+            return functools.partial(done.join_file, *store.split_text(buff))
+        start, end = buff.get_bounds()
+        return functools.partial(text_bytes, buff.get_text(start, end, False))
+
+    def is_unchanged(self, known, filename, data):
+        """Whether data is what the fingerprint known says is on disk."""
+        return known is not None and not compress.codec_for(filename) \
+            and known[2] is not None and known[0] == len(data) \
+            and content_digest(data) == known[2]
+
+    def save_the_file(self, filename, editor, key, on_done=None):
+        on_done = on_done or (lambda success: None)
+
+        # The viewer only holds a window of the file
+        if key in self.viewers:
+            on_done(False)
+            return
 
-            text += "\n" if not text.endswith("\n") else ""
+        # Ctrl+S pressed again while a write is in flight joins that write,
+        # unless there were edits since it took its copy; then another save
+        # follows it and reports for them
+        if key in self.is_saving:
+            count = getattr(editor.get_buffer(), "_change_count", 0)
+            if count == self.is_saving[key][1]:
+                self.save_waiters.setdefault(key, []).append(on_done)
+            else:
+                self.save_queue.setdefault(key, [filename, []])[1].append(
+                    on_done)
+            return
 
-            try:
-                gfile = gio.File.new_for_path(filename)
-                gfile.replace_contents(
-                    bytes(text, "utf-8"), None, False,
-                    gio.FileCreateFlags.NONE, None)
+        buff = editor.get_buffer()
+        if getattr(buff, "_load_failed", False):
+            self.show_save_error(filename, "The file did not load, so saving "
+                                 "would overwrite it with an empty text")
+            on_done(False)
+            return
 
-                self.after_save(filename, editor, key, gfile, old_filename)
-                return True
-            except glib.Error as e:
-                if e.code != 14:
-                    self.show_save_error(
-                        filename,
-                        "Check that you have write access to this file!")
-                    return False
-
-                admin_uri = f"admin://{filename}"
-                admin_file = gio.File.new_for_uri(admin_uri)
-
-                def on_admin_mounted(file, res, data):
-                    try:
-                        file.mount_enclosing_volume_finish(res)
-                    except glib.Error as e:
-                        if e.code != 17:
-                            self.show_save_error(filename, str(e))
-                            return
-
-                    try:
-                        file.replace_contents(
-                            bytes(text, "utf-8"),
-                            None,
-                            False,
-                            gio.FileCreateFlags.NONE,
-                            None)
-                    except glib.Error as e:
-                        if e.code == 14:
-                            return
-
-                        self.show_save_error(filename, str(e))
-                        return
-
-                    self.admin_files.add(filename)
-                    self.after_save(filename, editor, key, file, old_filename)
-
-                admin_file.mount_enclosing_volume(
-                    gio.MountMountFlags.NONE,
-                    None,
-                    None,
-                    on_admin_mounted,
-                    None)
+        try:
+            gfile = gio.File.new_for_path(filename)
+            self.save_async(filename, editor, key, gfile,
+                            self.file_snapshot(key, buff), on_done)
         except Exception as e:
             self.show_save_error(filename, str(e))
+            on_done(False)
+
+    def save_async(self, filename, editor, key, gfile, snapshot, on_done):
+        old_filename = self.files.get(key)
+        known = self.disk_state.get(key) if old_filename == filename else None
+        state = {"data": None}
+        buff = editor.get_buffer()
+        hbox = editor.get_parent().get_parent()
+        label = self.get_tab_label(hbox).get_first_child().get_next_sibling()
+        mode = config.get_config("save_durability")
+        if mode not in durable.MODES:
+            mode = "full"
+
+        codec = compress.codec_for(filename)
+        cancellable = gio.Cancellable()
+
+        # The view stays editable; what is typed during the write is kept
+        # as unsaved on top of the snapshot
+        change_count = getattr(buff, "_change_count", 0)
+
+        self.is_saving[key] = (cancellable, change_count)
+        self.saver_cancellable[key] = cancellable
+        self.save_waiters[key] = [on_done]
+        jnl = self.journals.get(key)
+        mark = jnl.checkpoint() if jnl else 0
+        label.get_style_context().add_class("moving-gradient")
+
+        def typed_over():
+            """Journal position of edits made during the write, or None."""
+            if getattr(buff, "_change_count", 0) == change_count:
+                return None
+            return mark
+
+        def finish(success):
+            label.get_style_context().remove_class("moving-gradient")
+            self.is_saving.pop(key, None)
+            self.saver_cancellable.pop(key, None)
+            for callback in self.save_waiters.pop(key, []):
+                callback(success)
+
+            queued = self.save_queue.pop(key, None)
+            if queued is None:
+                return
+            queued_name, callbacks = queued
+
+            def report(result):
+                for callback in callbacks:
+                    callback(result)
+
+            if success and not getattr(buff, "_closed", False):
+                self.save_the_file(queued_name, editor, key, report)
+            else:
+                report(False)
+
+        def on_admin_written(admin_file, error):
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                finish(False)
+                return
+            if error is not None:
+                finish(False)
+                # Permission denied here means the password was refused
+                if error.code != gio.IOErrorEnum.PERMISSION_DENIED:
+                    self.show_save_error(filename, error.message)
+                return
+
+            self.after_save(
+                filename, editor, key, admin_file, old_filename,
+                state["data"], typed_over())
+            finish(True)
+
+        def save_as_admin():
+            try:
+                payload = compress.compress(codec, state["data"])
+            except OSError as e:
+                finish(False)
+                self.show_save_error(filename, str(e))
+                return
+            self.write_admin(filename, payload, on_admin_written)
+
+        def on_written(error):
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                finish(False)
+                return False
+
+            if isinstance(error, PermissionError):
+                save_as_admin()
+                return False
+            if error is not None:
+                finish(False)
+                self.show_save_error(filename, str(error))
+                return False
+
+            self.after_save(
+                filename, editor, key, gfile, old_filename,
+                state["data"], typed_over())
+            finish(True)
             return False
 
-    def after_save(self, filename, editor, key, gfile, old_filename):
+        def on_unchanged():
+            if cancellable.is_cancelled() or getattr(buff, "_closed", False):
+                finish(False)
+                return False
+            self.save_stats["writes_skipped"] += 1
+            self.save_stats["bytes_saved"] += len(state["data"])
+            if typed_over() is None:
+                buff.set_modified(False)
+            completions.CompletionLog(filename).remove()
+            finish(True)
+            return False
+
+        # Known to need elevation, so skip the failing local write
+        as_admin = filename in self.admin_files
+
+        def write():
+            try:
+                state["data"] = data = snapshot()
+                if self.is_unchanged(known, filename, data):
+                    glib.idle_add(on_unchanged)
+                    return
+                if as_admin:
+                    glib.idle_add(save_as_admin)
+                    return
+                durable.write_file(
+                    filename, compress.compress(codec, data), mode,
+                    cancellable)
+            except OSError as e:
+                glib.idle_add(on_written, e)
+                return
+            glib.idle_add(on_written, None)
+
+        threading.Thread(target=write, daemon=True).start()
+
+    def write_admin(self, filename, data, callback):
+        """
+        Write data to filename through the admin:// backend, then call
+        callback(admin_file, error). The mount is made once and reused
+        until it goes away, so only the first save asks for a password.
+        """
+        admin_file = self.admin_files.get(filename) or \
+            gio.File.new_for_uri(f"admin://{filename}")
+        state = {"mounted": False}
+
+        def write():
+            admin_file.replace_contents_bytes_async(
+                glib.Bytes.new(data),
+                None,
+                False,
+                gio.FileCreateFlags.NONE,
+                None,
+                on_replaced,
+                None)
+
+        def on_replaced(file, res, *args):
+            try:
+                file.replace_contents_finish(res)
+            except glib.Error as e:
+                # Unmounted behind our back; mount again once
+                if e.code == gio.IOErrorEnum.NOT_MOUNTED and \
+                        not state["mounted"]:
+                    self.admin_mount = None
+                    mount()
+                    return
+                callback(file, e)
+                return
+            self.admin_files[filename] = file
+            callback(file, None)
+
+        def on_mounted(file, res, *args):
+            try:
+                file.mount_enclosing_volume_finish(res)
+            except glib.Error as e:
+                if e.code != gio.IOErrorEnum.ALREADY_MOUNTED:
+                    callback(file, e)
+                    return
+            state["mounted"] = True
+            try:
+                self.admin_mount = file.find_enclosing_mount(None)
+                self.admin_mount.connect("unmounted", self.on_admin_unmounted)
+            except glib.Error:
+                self.admin_mount = None
+            write()
+
+        def mount():
+            admin_file.mount_enclosing_volume(
+                gio.MountMountFlags.NONE,
+                None,
+                None,
+                on_mounted,
+                None)
+
+        if self.admin_mount is not None:
+            write()
+        else:
+            mount()
+
+    def on_admin_unmounted(self, mount):
+        if mount is self.admin_mount:
+            self.admin_mount = None
+
+    def after_save(self, filename, editor, key, gfile, old_filename,
+                   data=None, typed=None):
         if old_filename and old_filename != filename:
             self.app.unregister_file(old_filename)
 
-        info = gfile.query_info(
-            "standard::*", gio.FileQueryInfoFlags.NONE, None)
-        mime_type = info.get_content_type()
+        if compress.codec_for(filename):
+            mime_type = "text/plain"
+        else:
+            info = gfile.query_info(
+                "standard::*", gio.FileQueryInfoFlags.NONE, None)
+            mime_type = info.get_content_type()
 
         lang_man = gtksource.LanguageManager.get_default()
-        lang = lang_man.guess_language(filename, mime_type)
+        lang = lang_man.guess_language(
+            compress.plain_name(filename), mime_type)
 
         buff = editor.get_buffer()
         buff.set_language(self.get_language_for_buffer(lang, mime_type))
-        buff.set_modified(False)
+        if typed is None:
+            buff.set_modified(False)
 
         subtype = mime_type.split("/", 1)[1]
         filetype = (subtype[2:].upper()
                     if subtype.startswith("x-")
                     else subtype.upper())
 
-        page = self.get_current_tab()
+        page = editor.get_parent().get_parent()
         page.gfile = gfile
         page.file_type = filetype
 
         self.files[key] = filename
 
-        old = self.monitors.pop(key, None)
-        if old:
-            old.cancel()
-        monitor = gfile.monitor_file(gio.FileMonitorFlags.NONE, None)
-        menu = self.app.get_active_window().menu
-        monitor.connect("changed", menu.file_changed, self, key, page)
-        self.monitors[key] = monitor
+        # The directory watch survives the save; only Save As moves it
+        watch = self.monitors.get(key)
+        if watch is None or watch.path != filename:
+            if watch:
+                watch.cancel()
+            menu = self.app.get_active_window().menu
+            self.monitors[key] = self.app.watcher.watch(
+                filename, menu.file_changed, self, key, page)
 
         if key in self.unsave:
             del self.unsave[key]
@@ -1244,7 +2769,137 @@ class Notebook(gtk.Notebook):
         self.update_window_title(label)
 
         self.app.register_file(filename, self.app.get_active_window(), key)
-        self.recently_saved[key] = time.monotonic()
+        self.record_disk_state(key, filename)
+        completions.CompletionLog(filename).remove()
+
+        jnl = self.journals.get(key)
+        if jnl:
+            jnl.compact(filename, typed)
+        else:
+            self.attach_journal(key, filename, buff)
+
+        self.archiver.maybe_rotate(key, filename)
+
+        if data is not None:
+            self.replica.record(key, data)
+
+        budget = config.get_config("history_budget")
+        if data is not None and budget and filename == config.get_filepath():
+            self.get_history(filename).record_async(data, budget)
+
+    def get_history(self, filename):
+        if filename not in self.histories:
+            self.histories[filename] = history.History(filename)
+        return self.histories[filename]
+
+    def show_history(self):
+        key = self.key
+        filename = self.files.get(key)
+        if filename is None or key in self.viewers:
+            return
+
+        versions = self.get_history(filename).versions()[::-1]
+        dialog, vbox = self.action_message(
+            self.app.get_active_window(),
+            "History",
+            f"{len(versions)} saved version{'' if len(versions) == 1 else 's'}"
+            f" of {os.path.basename(filename)}")
+
+        model = gtk.StringList.new([
+            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(m['time']))}"
+            f"    {m['size']:,} bytes"
+            for m in versions])
+        selection = gtk.SingleSelection(model=model)
+
+        def bind_item(factory, list_item):
+            list_item.get_child().set_text(list_item.get_item().get_string())
+
+        factory = gtk.SignalListItemFactory()
+        factory.connect(
+            "setup", lambda f, item: item.set_child(gtk.Label(xalign=0)))
+        factory.connect("bind", bind_item)
+
+        scroller = gtk.ScrolledWindow()
+        scroller.set_policy(gtk.PolicyType.NEVER, gtk.PolicyType.AUTOMATIC)
+        scroller.set_min_content_width(360)
+        scroller.set_min_content_height(300)
+        scroller.set_child(gtk.ListView(model=selection, factory=factory))
+        vbox.append(scroller)
+
+        def on_restore(btn):
+            position = selection.get_selected()
+            dialog.close()
+            if position < len(versions):
+                self.restore_version(key, filename, versions[position])
+
+        btn_box = gtk.Box(orientation=gtk.Orientation.HORIZONTAL, spacing=12)
+        btn_box.set_homogeneous(True)
+        menu = self.app.get_active_window().menu
+        btn_box.append(menu.make_button(dialog, "Close"))
+        btn_restore = gtk.Button(label="Restore")
+        btn_restore.get_style_context().add_class("suggested-action")
+        btn_restore.set_sensitive(bool(versions))
+        btn_restore.connect("clicked", on_restore)
+        btn_box.append(btn_restore)
+        vbox.append(btn_box)
+
+        dialog.set_child(vbox)
+        dialog.present()
+
+    def restore_version(self, key, filename, manifest):
+        """Put an old version in the buffer as one undoable edit."""
+        store = self.get_history(filename)
+
+        def on_rebuilt(text, error):
+            view = self.editor_instance.get(key)
+            if view is None:
+                return False
+            if error is not None:
+                print(f"Warning: Could not restore version: {error}")
+                return False
+
+            buff = view.get_buffer()
+            if self.defer_while_replacing(
+                    buff, lambda: on_rebuilt(text, error)):
+                return False
+            done_lines = None
+            if self.hides_done_items(filename):
+                text, done_lines = done.split_done_text(text)
+
+            start, end = buff.get_bounds()
+            old = diffutil.split_lines(buff.get_text(start, end, True))
+            new = diffutil.split_lines(text)
+            self.block_signal = True
+            try:
+                diffutil.apply_hunks(
+                    buff, old, new, diffutil.line_hunks(old, new))
+            finally:
+                self.block_signal = False
+
+            if done_lines is not None:
+                previous = self.done_stores.pop(key, None)
+                if done_lines:
+                    restored = done.DoneStore()
+                    restored.lines = done_lines
+                    self.done_stores[key] = restored
+                # Changed hidden lines need saving as much as visible ones
+                if (previous.lines if previous else []) != done_lines:
+                    buff.set_modified(True)
+
+            if key == self.key:
+                self.update_statusbar_cursor_info()
+                self.on_search_entry_changed(self.navbar.search_entry)
+            return False
+
+        def work():
+            try:
+                text = store.rebuild(manifest).decode("utf-8", "replace")
+            except (OSError, KeyError, ValueError, zlib.error) as e:
+                glib.idle_add(on_rebuilt, None, e)
+                return
+            glib.idle_add(on_rebuilt, text, None)
+
+        threading.Thread(target=work, daemon=True).start()
 
     def show_save_error(self, filename, text):
         dialog, vbox = self.action_message(
@@ -1263,8 +2918,7 @@ class Notebook(gtk.Notebook):
         if key not in self.files:
             self.save_as_file(editor, key, tab_title, on_done)
         else:
-            success = self.save_the_file(self.files[key], editor, key)
-            on_done(success)
+            self.save_the_file(self.files[key], editor, key, on_done)
 
     def update_window_title(self, title=None, modified=False):
         from .helper import config
@@ -1284,7 +2938,7 @@ class Notebook(gtk.Notebook):
                 break
 
         if not has_unsaved:
-            self.finalize_close(window)
+            self.flush_completions(lambda: self.finalize_close(window))
             return
 
         # Show Save/Exit/Cancel prompt
@@ -1304,14 +2958,15 @@ class Notebook(gtk.Notebook):
             def on_saved(success):
                 dialog.destroy()
                 if success:
-                    self.finalize_close(window)
+                    self.flush_completions(
+                        lambda: self.finalize_close(window))
                 # If save failed, stay open (dialog already destroyed)
 
             self.save_current(label, self.value, self.key, on_saved)
 
         def on_exit_without_saving():
             dialog.destroy()
-            self.finalize_close(window)
+            self.flush_completions(lambda: self.finalize_close(window))
 
         def on_cancel():
             dialog.destroy()
@@ -1444,7 +3099,7 @@ class Notebook(gtk.Notebook):
                        for i in range(total) if store.get_item(i).checked]
 
             if not to_save:
-                self.finalize_close(window)
+                self.flush_completions(lambda: self.finalize_close(window))
                 return
 
             remaining = {"count": len(to_save)}
@@ -1453,24 +3108,107 @@ class Notebook(gtk.Notebook):
                 if success:
                     remaining["count"] -= 1
                     if remaining["count"] == 0:
-                        self.finalize_close(window)
+                        self.flush_completions(
+                            lambda: self.finalize_close(window))
 
             for item in to_save:
                 tab = item.tabdata
                 self.save_current(
                     tab["label"], tab["editor"], tab["key"], on_done)
         else:
-            self.finalize_close(window)
+            self.flush_completions(lambda: self.finalize_close(window))
+
+    def flush_completions(self, on_done):
+        """
+        Get logged completions into their files before the window closes,
+        then call on_done. A buffer with no other unsaved edits is saved;
+        one whose edits were declined is left alone, and the completions
+        are folded into the file on disk instead.
+        """
+        pending = [
+            (filename, key) for key, filename in self.files.items()
+            if filename and key in self.editor_instance
+            and completions.CompletionLog(filename).pending()]
+        if not pending:
+            on_done()
+            return
+
+        remaining = {key for _, key in pending}
+        failed = set()
+
+        def on_saved(success, key):
+            remaining.discard(key)
+            if not success:
+                failed.add(key)
+            # A failed save keeps the window open, as with Save and Exit
+            if not remaining and not failed:
+                on_done()
+
+        for filename, key in pending:
+            editor = self.editor_instance[key]
+
+            def callback(success, key=key):
+                on_saved(success, key)
+
+            if editor.get_buffer().get_modified():
+                self.fold_completions(filename, callback)
+            else:
+                self.save_the_file(filename, editor, key, callback)
+
+    def fold_completions(self, filename, on_done):
+        """Apply the completion log of filename to the file on disk."""
+        log = completions.CompletionLog(filename)
+        codec = compress.codec_for(filename)
+        mode = config.get_config("save_durability")
+        if mode not in durable.MODES:
+            mode = "full"
+
+        def work():
+            try:
+                with open(filename, "rb") as f:
+                    data = compress.decompress(codec, f.read())
+                text, applied = log.apply(data.decode("utf-8"))
+                if applied:
+                    durable.write_file(filename, compress.compress(
+                        codec, text.encode("utf-8")), mode)
+                log.remove()
+            except Exception as e:
+                # The log stays and is replayed on the next load
+                glib.idle_add(failed, str(e))
+                return
+            glib.idle_add(on_done, True)
+
+        def failed(text):
+            self.show_save_error(filename, text)
+            on_done(False)
+
+        threading.Thread(target=work, daemon=True).start()
 
     def finalize_close(self, window):
-        if hasattr(self, "loader_cancellable"):
-            for key, cancellable in list(self.loader_cancellable.items()):
+        for attr in ("loader_cancellable", "saver_cancellable"):
+            if not hasattr(self, attr):
+                continue
+            pending = getattr(self, attr)
+            for key, cancellable in list(pending.items()):
                 try:
                     if cancellable and not cancellable.is_cancelled():
                         cancellable.cancel()
                 except Exception:
                     pass
-            self.loader_cancellable.clear()
+            pending.clear()
+
+        # Leaving through this path means unsaved edits were declined
+        for key in list(getattr(self, "journals", {})):
+            self.discard_journal(key)
+
+        for fv in getattr(self, "viewers", {}).values():
+            fv.close()
+
+        for watch in getattr(self, "monitors", {}).values():
+            watch.cancel()
+
+        if hasattr(self, "replica"):
+            self.replica.stop()
 
         nb = window.nb
         if hasattr(nb, "switch_id"):
@@ -1481,12 +3219,17 @@ class Notebook(gtk.Notebook):
 
         attrs_to_del = [
             "editor_instance", "files", "unsave", "key", "value",
-            "monitors", "pending_reload", "recently_saved", "switch_id",
+            "monitors", "pending_reload", "disk_state", "switch_id",
             "findbar_visible", "search_text", "result_label", "context"
             "case_sensitive", "whole_word", "use_regex",
-            "search_error", "file_event_timer",
+            "search_error",
             "block_signal", "search_context", "gtlbar_visible", "gtl_text",
-            "search_cancellable", "loader_cancellable", "last_button_status"
+            "search_cancellable", "loader_cancellable", "last_button_status",
+            "is_saving", "save_waiters", "save_queue", "saver_cancellable",
+            "journals", "pending_recovery", "viewers", "perf_check_timer",
+            "done_stores", "histories", "replica",
+            "applied_search", "search_refresh_timeout", "search_results",
+            "pending_find", "highlight_idle"
         ]
 
         for attr in attrs_to_del:
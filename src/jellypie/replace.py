@@ -0,0 +1,164 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import re
+import threading
+from . import search, worker
+from .helper import gtk, gio, glib, GObject
+
+# Matches expanded between checks of the cancellable
+MATCH_BATCH = 1000
+# Characters of context either side of a match in the preview
+PREVIEW_CONTEXT = 40
+
+
+def expand(match, template, use_regex):
+    """Replacement text for match; raises re.error for a bad template."""
+    return match.expand(template) if use_regex else template
+
+
+class ReplacePlan:
+    """
+    Every substitution of a replace-all, worked out against a snapshot of
+    the buffer: offsets of the matches, their replacements and the line
+    each one is on.
+    """
+
+    def __init__(self, text, starts, ends, texts, lines):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.starts)
+
+    def describe(self, i):
+        text = self.text
+        start, end = self.starts[i], self.ends[i]
+        line_start = max(text.rfind("\n", 0, start) + 1,
+                         start - PREVIEW_CONTEXT)
+        line_end = text.find("\n", end)
+        if line_end == -1:
+            line_end = len(text)
+        line_end = min(line_end, end + PREVIEW_CONTEXT)
+
+        before = text[line_start:line_end]
+        after = text[line_start:start] + self.texts[i] + text[end:line_end]
+        return f"{self.lines[i] + 1}: {before}  →  {after}"
+
+
+def plan_async(text, pattern, template, use_regex, cancellable, callback,
+               on_error, known=None, budget=None):
+    """
+    Work out a replace-all in one pass over text on a worker thread, then
+    call callback(plan) on the main loop, or on_error(message). known, the
+    match starts of a finished search for pattern over the same text,
+    saves scanning for them again. With a budget the regex runs in a child
+    process, killed like a budgeted search once it stalls.
+    """
+    def deliver(plan):
+        if not cancellable.is_cancelled():
+            callback(plan)
+        return False
+
+    def fail(message):
+        if not cancellable.is_cancelled():
+            on_error(message)
+        return False
+
+    def matches():
+        if known is None:
+            yield from pattern.finditer(text)
+            return
+        for start in known:
+            match = pattern.match(text, start)
+            if match:
+                yield match
+
+    def run():
+        starts = []
+        ends = []
+        texts = []
+        lines = []
+        line = 0
+        last = 0
+        try:
+            for match in matches():
+                start = match.start()
+                line += text.count("\n", last, start)
+                last = start
+                starts.append(start)
+                ends.append(match.end())
+                texts.append(expand(match, template, use_regex))
+                lines.append(line)
+                if len(starts) % MATCH_BATCH == 0 and \
+                        cancellable.is_cancelled():
+                    return
+        except (re.error, IndexError) as e:
+            glib.idle_add(fail, f"Bad replacement: {e}")
+            return
+        glib.idle_add(deliver, ReplacePlan(text, starts, ends, texts, lines))
+
+    def run_budgeted():
+        plan = ([], [], [], [])
+        errors = []
+
+        def on_message(message):
+            if message[0] == "error":
+                errors.append(message[1])
+                return
+            for column, values in zip(plan, message[1:]):
+                column.extend(values)
+
+        try:
+            finished = search.run_in_child(
+                worker.plan_all,
+                (text, pattern.pattern, pattern.flags, template, use_regex,
+                 known),
+                cancellable, budget, on_message)
+        except TimeoutError:
+            glib.idle_add(fail, "Too slow")
+            return
+        if errors:
+            glib.idle_add(fail, f"Bad replacement: {errors[0]}")
+        elif finished:
+            glib.idle_add(deliver, ReplacePlan(text, *plan))
+
+    threading.Thread(
+        target=run_budgeted if budget else run, daemon=True).start()
+
+
+class PreviewModel(GObject.Object, gio.ListModel):
+    """List model over a plan that formats each row only when it is shown."""
+
+    def __init__(self, plan):
+        super().__init__()
+        self.plan = plan
+
+    def do_get_item_type(self):
+        return gtk.StringObject.__gtype__
+
+    def do_get_n_items(self):
+        return len(self.plan)
+
+    def do_get_item(self, position):
+        if position >= len(self.plan):
+            return None
+        return gtk.StringObject.new(self.plan.describe(position))
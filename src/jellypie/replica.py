@@ -0,0 +1,424 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import re
+import uuid
+from collections import Counter
+from . import diffutil
+from .done import DONE_MARK
+from .helper import gtk, glib, config, CONFIG_PATH
+
+STATE_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "replica.json")
+LOG_SUFFIX = ".ops"
+MARKED = re.compile(r"^✓ (.*) \[\d{4}-\d{2}-\d{2} \d{2}:\d{2}\]$")
+
+
+def list_end(lines):
+    """Index past the last line, ignoring the empty one after a final \\n."""
+    return len(lines) - 1 if lines and lines[-1] == "" else len(lines)
+
+
+def open_end(lines):
+    """Index of the first line of the trailing block of ✓ lines."""
+    end = list_end(lines)
+    while end > 0 and lines[end - 1].startswith(DONE_MARK):
+        end -= 1
+    return end
+
+
+def insert_after(lines, text, after):
+    if after is None:
+        lines.insert(0, text)
+    elif after in lines:
+        lines.insert(lines.index(after) + 1, text)
+    else:
+        lines.insert(open_end(lines), text)
+
+
+def derive_ops(old, new):
+    """
+    Item operations that turn the lines old into new. Operations that add
+    or remove a line carry how many copies of it new holds, so a second
+    copy of an existing item is not taken for the first.
+    """
+    hunks = diffutil.line_hunks(old, new)
+    copies = Counter(new)
+    removed = Counter(
+        line for i1, i2, _, _ in hunks for line in old[i1:i2] if line.strip())
+
+    ops = []
+    leftover = []
+    for i1, i2, j1, j2 in hunks:
+        adds = []
+        for j in range(j1, j2):
+            text = new[j]
+            if not text.strip():
+                continue
+            after = new[j - 1] if j > 0 else None
+            marked = MARKED.match(text)
+            if removed[text]:
+                removed[text] -= 1
+                ops.append({"op": "move", "item": text, "after": after})
+            elif marked and removed[marked.group(1)]:
+                removed[marked.group(1)] -= 1
+                ops.append({"op": "done", "item": marked.group(1),
+                            "marked": text,
+                            "left": copies[marked.group(1)]})
+            else:
+                adds.append((text, after))
+        leftover.append((old[i1:i2], adds))
+
+    # What is left in each hunk pairs up as edits, in order
+    for olds, adds in leftover:
+        dels = []
+        for line in olds:
+            if line.strip() and removed[line]:
+                removed[line] -= 1
+                dels.append(line)
+        for i, (text, after) in enumerate(adds):
+            if i < len(dels):
+                ops.append({"op": "edit", "old": dels[i], "new": text,
+                            "after": after, "copies": copies[text],
+                            "left": copies[dels[i]]})
+            else:
+                ops.append({"op": "add", "text": text, "after": after,
+                            "copies": copies[text]})
+        for line in dels[len(adds):]:
+            ops.append({"op": "del", "item": line, "left": copies[line]})
+    return ops
+
+
+def apply_ops(lines, ops, hidden=()):
+    """
+    Apply item operations to a list of lines in place. Items are matched by
+    text and counted, and an operation whose result is already there is
+    skipped, so applying the same log twice changes nothing. Returns the
+    number applied.
+    """
+    hidden = Counter(hidden)
+
+    def present(text, copies=1):
+        return hidden[text] + lines.count(text) >= copies
+
+    def extra(text, left=0):
+        return lines.count(text) > left
+
+    applied = 0
+    for op in ops:
+        kind = op.get("op")
+        if kind == "add":
+            if present(op["text"], op.get("copies", 1)):
+                continue
+            insert_after(lines, op["text"], op.get("after"))
+        elif kind == "edit":
+            if present(op["new"], op.get("copies", 1)):
+                continue
+            if extra(op["old"], op.get("left", 0)):
+                lines[lines.index(op["old"])] = op["new"]
+            else:
+                # Edited here and removed or edited there; keep both
+                insert_after(lines, op["new"], op.get("after"))
+        elif kind == "done":
+            if present(op["marked"]):
+                continue
+            if extra(op["item"], op.get("left", 0)):
+                lines.remove(op["item"])
+            lines.insert(list_end(lines), op["marked"])
+        elif kind == "move":
+            if op["item"] not in lines or op.get("after") == op["item"]:
+                continue
+            index = lines.index(op["item"])
+            if index > 0 and lines[index - 1] == op.get("after") or \
+                    index == 0 and op.get("after") is None:
+                continue
+            del lines[index]
+            insert_after(lines, op["item"], op.get("after"))
+        elif kind == "del":
+            if not extra(op["item"], op.get("left", 0)):
+                continue
+            lines.remove(op["item"])
+        else:
+            continue
+        applied += 1
+    return applied
+
+
+class BufferLines:
+    """
+    The lines of a GtkTextBuffer behind the list methods apply_ops uses, so
+    remote operations edit the lines they name without copying the buffer.
+    """
+
+    def __init__(self, buff):
+        self.buff = buff
+
+    def __len__(self):
+        return self.buff.get_line_count()
+
+    def bounds(self, index):
+        if index < 0:
+            index += len(self)
+        start = self.buff.get_iter_at_line(index)[1]
+        end = start.copy()
+        if not end.ends_line():
+            end.forward_to_line_end()
+        return start, end
+
+    def __getitem__(self, index):
+        start, end = self.bounds(index)
+        return self.buff.get_text(start, end, True)
+
+    def __setitem__(self, index, text):
+        start, end = self.bounds(index)
+        self.buff.delete(start, end)
+        self.buff.insert(self.bounds(index)[0], text)
+
+    def __delitem__(self, index):
+        start, end = self.bounds(index)
+        if not end.forward_line():
+            # The last line takes the break before it instead
+            start.backward_char()
+        self.buff.delete(start, end)
+
+    def __contains__(self, text):
+        return self.find(text) is not None
+
+    def find(self, text):
+        it = self.buff.get_start_iter()
+        if not text:
+            while not it.ends_line():
+                if not it.forward_line():
+                    return None
+            return it.get_line()
+        while True:
+            match = it.forward_search(
+                text, gtk.TextSearchFlags.TEXT_ONLY, None)
+            if not match:
+                return None
+            start, end = match
+            if start.starts_line() and end.ends_line():
+                return start.get_line()
+            it = start
+            it.forward_char()
+
+    def count(self, text):
+        found = 0
+        it = self.buff.get_start_iter()
+        while True:
+            match = it.forward_search(
+                text, gtk.TextSearchFlags.TEXT_ONLY, None)
+            if not match:
+                return found
+            start, end = match
+            if start.starts_line() and end.ends_line():
+                found += 1
+                it = end
+            else:
+                it = start
+                it.forward_char()
+
+    def index(self, text):
+        line = self.find(text)
+        if line is None:
+            raise ValueError(text)
+        return line
+
+    def insert(self, index, text):
+        if index < len(self):
+            self.buff.insert(self.bounds(index)[0], text + "\n")
+        else:
+            self.buff.insert(self.buff.get_end_iter(), "\n" + text)
+
+    def remove(self, text):
+        del self[self.index(text)]
+
+
+class Replica:
+    """
+    Item-level replication of the todo file through a shared directory.
+
+    Each device appends the operations behind its saves (add, edit, done,
+    move, del) to its own <device>.ops log in replica_dir. The other logs
+    are tailed through the directory watch: only bytes past the offset
+    already read are parsed, and their operations are applied to the buffer
+    and to the last synced text, so the next local save only logs local
+    edits. Offsets and the device id live next to the config file, which is
+    not synced; the offsets are only kept once a save has written what was
+    read, so operations that never reached disk are read again next time.
+    """
+
+    def __init__(self, notebook):
+        self.nb = notebook
+        self.key = None
+        self.base = None
+        self.watch = None
+        self.load_state()
+
+    def load_state(self):
+        try:
+            with open(STATE_PATH, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.device = state.get("device") or uuid.uuid4().hex[:12]
+        self.saved_offsets = state.get("offsets", {})
+        self.offsets = dict(self.saved_offsets)
+
+    def save_state(self):
+        try:
+            with open(STATE_PATH, "w", encoding="utf-8") as f:
+                json.dump({"device": self.device,
+                           "offsets": self.saved_offsets}, f)
+        except OSError as e:
+            print(f"Warning: Could not write {STATE_PATH}: {e}")
+
+    def commit(self):
+        """Keep the read offsets once what was read is on disk."""
+        if self.saved_offsets != self.offsets:
+            self.saved_offsets = dict(self.offsets)
+            self.save_state()
+
+    def directory(self):
+        directory = config.get_config("replica_dir")
+        if not directory:
+            return None
+        return os.path.normpath(os.path.expanduser(directory))
+
+    def log_path(self):
+        return os.path.join(self.directory(), self.device + LOG_SUFFIX)
+
+    def start(self, key, filename, data):
+        """Track the freshly loaded todo file and catch up on other logs."""
+        directory = self.directory()
+        if not directory or filename != config.get_filepath():
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            print(f"Warning: Could not create {directory}: {e}")
+            return
+
+        if not os.path.exists(STATE_PATH):
+            # The device id has to outlive this run
+            self.save_state()
+        self.key = key
+        self.base = data.decode("utf-8", "replace").split("\n")
+        # Operations read but never saved are read again into the fresh text
+        self.offsets = dict(self.saved_offsets)
+        if self.watch is None:
+            self.watch = self.nb.app.watcher.watch_children(
+                directory, self.poll)
+        glib.idle_add(self.poll)
+
+    def stop(self):
+        if self.watch:
+            self.watch.cancel()
+            self.watch = None
+        self.key = None
+        self.base = None
+
+    def record(self, key, data):
+        """Log the operations behind a save of the todo file."""
+        if key != self.key or self.base is None:
+            return
+        lines = data.decode("utf-8", "replace").split("\n")
+        ops = derive_ops(self.base, lines)
+        self.base = lines
+        if ops:
+            try:
+                with open(self.log_path(), "a", encoding="utf-8") as f:
+                    f.write("".join(
+                        json.dumps(op, ensure_ascii=False) + "\n"
+                        for op in ops))
+            except OSError as e:
+                print(f"Warning: Could not write {self.log_path()}: {e}")
+        self.commit()
+        # Anything that arrived during the save was left unread
+        glib.idle_add(self.poll)
+
+    def read_new(self):
+        """Operations appended to the other devices' logs since last read."""
+        directory = self.directory()
+        own = self.device + LOG_SUFFIX
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return []
+
+        ops = []
+        for name in names:
+            if name == own or not name.endswith(LOG_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            offset = self.offsets.get(path, 0)
+            try:
+                size = os.path.getsize(path)
+                if size < offset:
+                    # Replaced by a shorter log, so start it over
+                    offset = 0
+                if size == offset:
+                    continue
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read(size - offset)
+            except OSError:
+                continue
+
+            # A record still being written waits for the next event
+            complete = chunk.rfind(b"\n") + 1
+            for line in chunk[:complete].splitlines():
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    continue
+            self.offsets[path] = offset + complete
+        return ops
+
+    def poll(self):
+        key = self.key
+        editor = self.nb.editor_instance.get(key) if key else None
+        if editor is None or self.base is None:
+            return False
+        buff = editor.get_buffer()
+        if getattr(buff, "_is_loading", False) or key in self.nb.is_saving:
+            # The load or save finishing polls again
+            return False
+        if self.nb.defer_while_replacing(buff, self.poll):
+            return False
+
+        ops = self.read_new()
+        if not ops:
+            return False
+        apply_ops(self.base, ops)
+
+        store = self.nb.done_stores.get(key)
+        hidden = [line.decode("utf-8", "replace")
+                  for line in store.lines] if store else ()
+        was_modified = buff.get_modified()
+        buff.begin_user_action()
+        applied = apply_ops(BufferLines(buff), ops, hidden)
+        buff.end_user_action()
+        if not applied:
+            # Nothing to save, so the offsets can be kept right away
+            self.commit()
+        elif not was_modified:
+            # Nothing local is pending, so write the merged list straight back
+            self.nb.save_the_file(self.nb.files[key], editor, key)
+        return False
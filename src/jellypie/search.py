@@ -0,0 +1,218 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import bisect
+import functools
+import multiprocessing
+import re
+import threading
+import time
+from . import worker
+from .helper import glib
+
+# Matches collected, or characters passed, between checks of the
+# cancellable
+MATCH_BATCH = 1000
+CHECK_SPAN = 1 << 16
+# Matches found before a first, partial result is published
+COUNT_CAP = 1000
+# Seconds between checks for cancellation while a child process searches
+POLL_INTERVAL = 0.05
+PATTERN_CACHE = 64
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE)
+def cached_pattern(pattern, flags=0):
+    """Compiled pattern, or None if it does not compile."""
+    try:
+        return re.compile(pattern, flags)
+    except re.error:
+        return None
+
+
+def compile_pattern(text, case_sensitive, whole_word, use_regex):
+    """Compile the find bar's query, or None for a bad regex."""
+    flags = re.MULTILINE
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+
+    if use_regex:
+        pattern = r"\b(?:{})\b".format(text) if whole_word else text
+    else:
+        pattern = re.escape(text)
+        pattern = r"\b" + pattern + r"\b" if whole_word else pattern
+    return cached_pattern(pattern, flags)
+
+
+class SearchResult:
+    """
+    Character offsets of the matches of pattern in a snapshot of a
+    buffer. A result that is not complete holds only the first matches of
+    a scan still running.
+    """
+
+    def __init__(self, starts, ends, complete=True, pattern=None):
+        self.starts = starts
+        self.ends = ends
+        self.complete = complete
+        self.pattern = pattern
+
+    def __len__(self):
+        return len(self.starts)
+
+    def position(self, start, end):
+        """1-based index of the match spanning start..end, or 0."""
+        i = bisect.bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start and \
+                self.ends[i] == end:
+            return i + 1
+        return 0
+
+    def next_index(self, start, end):
+        i = bisect.bisect_left(self.starts, end)
+        # An empty match at the cursor would be found again and again
+        if i < len(self.starts) and self.starts[i] == start and \
+                self.ends[i] == end:
+            i += 1
+        return i if i < len(self.starts) else 0
+
+    def prev_index(self, start, end):
+        i = bisect.bisect_left(self.starts, start) - 1
+        return i if i >= 0 else len(self.starts) - 1
+
+    def between(self, low, high):
+        """Indexes of the matches starting in low..high."""
+        return range(bisect.bisect_left(self.starts, low),
+                     bisect.bisect_right(self.starts, high))
+
+
+def scan_async(text, pattern, cancellable, callback):
+    """
+    Find every match of pattern in text on a worker thread, then call
+    callback(result) on the main loop unless cancellable was cancelled.
+    Once COUNT_CAP matches are found, callback also gets an incomplete
+    result so the first matches show while the count goes on. The text is
+    a copy, so the buffer can change while the scan runs.
+    """
+    def deliver(result):
+        if not cancellable.is_cancelled():
+            callback(result)
+        return False
+
+    def run():
+        starts = []
+        ends = []
+        checked = 0
+        for match in pattern.finditer(text):
+            start = match.start()
+            starts.append(start)
+            ends.append(match.end())
+            if len(starts) == COUNT_CAP:
+                glib.idle_add(deliver, SearchResult(
+                    starts[:], ends[:], False, pattern))
+            # Sparse matches over a long text would otherwise run on long
+            # after the query changed
+            if len(starts) % MATCH_BATCH == 0 or \
+                    start - checked > CHECK_SPAN:
+                if cancellable.is_cancelled():
+                    return
+                checked = start
+        glib.idle_add(deliver, SearchResult(starts, ends, True, pattern))
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def run_in_child(target, args, cancellable, budget, on_message):
+    """
+    Run target(conn, *args) in a child process from a worker thread, and
+    pass what it sends through conn to on_message until it sends
+    ("done",). Returns True then, or False if cancellable was cancelled.
+    Raises TimeoutError once budget seconds pass without a message, or
+    when the child dies, since re cannot be interrupted any other way.
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=target, args=(sender,) + args,
+                              daemon=True)
+    process.start()
+    sender.close()
+
+    progress = time.monotonic()
+    try:
+        while not cancellable.is_cancelled():
+            if not receiver.poll(POLL_INTERVAL):
+                if time.monotonic() - progress > budget:
+                    raise TimeoutError
+                continue
+
+            message = receiver.recv()
+            progress = time.monotonic()
+            if message[0] == "done":
+                return True
+            on_message(message)
+        return False
+    except (EOFError, OSError) as e:
+        # The child died, most likely out of memory
+        raise TimeoutError from e
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+
+def scan_budgeted(text, pattern, cancellable, callback, budget, on_slow):
+    """
+    Like scan_async, but the search runs in a child process that is killed
+    once budget seconds pass without a match or the end of the text. A
+    thread would not freeze the editor, but it cannot be stopped, so a
+    runaway regex would keep a core busy until it finished; this way it
+    calls on_slow() and leaves nothing running.
+    """
+    def deliver(result):
+        if not cancellable.is_cancelled():
+            callback(result)
+        return False
+
+    def give_up():
+        if not cancellable.is_cancelled():
+            on_slow()
+        return False
+
+    def run():
+        starts = []
+        ends = []
+
+        def on_message(message):
+            capped = len(starts) < COUNT_CAP
+            starts.extend(message[1])
+            ends.extend(message[2])
+            if capped and len(starts) >= COUNT_CAP:
+                glib.idle_add(deliver, SearchResult(
+                    starts[:], ends[:], False, pattern))
+
+        try:
+            if run_in_child(worker.find_all,
+                            (text, pattern.pattern, pattern.flags),
+                            cancellable, budget, on_message):
+                glib.idle_add(
+                    deliver, SearchResult(starts, ends, True, pattern))
+        except TimeoutError:
+            glib.idle_add(give_up)
+
+    threading.Thread(target=run, daemon=True).start()
@@ -31,11 +31,21 @@ class StatusBar(gtk.Overlay):
 
         self.add_overlay(self.info_label)
 
+        self.mode_label = gtk.Label(label="Performance mode")
+        self.mode_label.get_style_context().add_class("info-label")
+        self.mode_label.set_tooltip_text(
+            "Wrapping and highlighting are off for this large document")
+        self.mode_label.set_halign(gtk.Align.START)
+        self.mode_label.set_valign(gtk.Align.END)
+        self.mode_label.set_visible(False)
+
+        self.add_overlay(self.mode_label)
+
         self.timeout_id = None
 
-    def show_line_col(self, buff, filetype, mode=None):
+    def show_line_col(self, buff, filetype, mode=None, first_line=0):
         _iter = buff.get_iter_at_mark(buff.get_insert())
-        row = _iter.get_line() + 1
+        row = first_line + _iter.get_line() + 1
         col = _iter.get_line_offset() + 1
 
         line_col = f"{row}:{col}     "
@@ -60,3 +70,6 @@ class StatusBar(gtk.Overlay):
         self.info_label.set_visible(False)
         self.timeout_id = None
         return False
+
+    def show_performance_mode(self, active):
+        self.mode_label.set_visible(active)
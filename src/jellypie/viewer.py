@@ -0,0 +1,375 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+import os
+import threading
+from operator import itemgetter
+from . import search, worker
+from .helper import glib, gtk
+
+INDEX_BLOCK = 1024 * 1024
+READ_STEP = 256 * 1024
+WINDOW_LINES = 3000
+EDGE_LINES = 300
+
+
+def skip_lines(fd, offset, count):
+    """
+    Offset count lines on from the line start offset, and the number of
+    lines skipped, fewer at the end of the file, where a last line without
+    a newline still counts.
+    """
+    skipped = 0
+    partial = False
+    while skipped < count:
+        block = os.pread(fd, READ_STEP, offset)
+        if not block:
+            return offset, skipped + partial
+        newlines = block.count(b"\n")
+        if skipped + newlines >= count:
+            newline = -1
+            for _ in range(count - skipped):
+                newline = block.find(b"\n", newline + 1)
+            return offset + newline + 1, count
+        skipped += newlines
+        offset += len(block)
+        partial = not block.endswith(b"\n")
+    return offset, skipped
+
+
+def count_lines(fd, line, offset, target):
+    """Line number and line start of byte target, from a known line start."""
+    start = offset
+    while offset < target:
+        block = os.pread(fd, min(READ_STEP, target - offset), offset)
+        if not block:
+            break
+        line += block.count(b"\n")
+        newline = block.rfind(b"\n")
+        if newline != -1:
+            start = offset + newline + 1
+        offset += len(block)
+    return line, start
+
+
+class FileViewer:
+    """
+    Read-only view of a file too large to load into a GtkTextBuffer.
+
+    Only WINDOW_LINES lines around the viewport live in the buffer, read
+    with pread, so a file truncated under the viewer reads short instead
+    of faulting the way a mapping would. A background thread records the
+    line number at the start of every INDEX_BLOCK bytes, which is enough
+    to turn line numbers into byte offsets and back with one short scan.
+    Each entry is a (line, offset) pair, so the main loop never sees half
+    of one. Lines beyond what is indexed so far are found on a worker
+    thread and kept as extra marks.
+    """
+
+    def __init__(self, view, path):
+        self.view = view
+        self.buff = view.get_buffer()
+        self.path = path
+        self.first = 0
+        self.count = 0
+        self.end_offset = 0
+        self.total_lines = None
+        self.shifting = False
+        self.fd = None
+
+        self.buff._is_viewer = True
+        self.buff.set_highlight_syntax(False)
+        view.set_editable(False)
+        view.set_wrap_mode(gtk.WrapMode.NONE)
+        view.get_vadjustment().connect("value-changed", self.on_scrolled)
+
+        self.open()
+
+    def open(self):
+        self.generation = getattr(self, "generation", 0) + 1
+        self.index = [(0, 0)]
+        self.marks = []
+        self.total_lines = None
+
+        self.fd = os.open(self.path, os.O_RDONLY)
+        self.size = os.fstat(self.fd).st_size
+
+        threading.Thread(
+            target=self.build_index, args=(self.generation,),
+            daemon=True).start()
+        self.show_lines(0)
+
+    def reopen(self):
+        top = self.first
+        self.close()
+        self.open()
+        self.show_lines(top)
+
+    def close(self):
+        self.generation += 1
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def build_index(self, generation):
+        lines = 0
+        start = 0
+        last = b""
+        try:
+            with open(self.path, "rb") as f:
+                while generation == self.generation:
+                    block = f.read(INDEX_BLOCK)
+                    if not block:
+                        break
+                    newline = block.find(b"\n")
+                    if newline != -1:
+                        self.index.append((lines + 1, start + newline + 1))
+                    lines += block.count(b"\n")
+                    start += len(block)
+                    last = block
+        except OSError:
+            return
+
+        if generation == self.generation:
+            # No line starts after a newline that ends the file
+            if self.index[-1][1] == start and len(self.index) > 1:
+                self.index.pop()
+            total = lines + (0 if last.endswith(b"\n") else 1)
+            glib.idle_add(self.on_indexed, total, generation)
+
+    def on_indexed(self, total, generation):
+        if generation == self.generation:
+            self.total_lines = total
+        return False
+
+    def nearest(self, value, field):
+        """The known (line, offset) closest before value, by line or offset."""
+        best = self.index[0]
+        for entries in (self.index, self.marks):
+            i = bisect.bisect_right(entries, value, key=itemgetter(field)) - 1
+            if i >= 0 and entries[i][field] > best[field]:
+                best = entries[i]
+        return best
+
+    def covered(self, line):
+        """Whether line is at most one short scan from a known offset."""
+        return self.total_lines is not None or \
+            self.index[-1][0] > line or self.nearest(line, 0)[0] == line
+
+    def add_marks(self, marks):
+        for mark in marks:
+            if mark not in self.marks:
+                bisect.insort(self.marks, mark)
+
+    def locate(self, fd, line):
+        """(line, offset) of the start of line, scanned on from the index."""
+        current, offset = self.nearest(line, 0)
+        offset, skipped = skip_lines(fd, offset, line - current)
+        return current + skipped, offset
+
+    def line_offset(self, line):
+        """Byte offset where line starts, or the file size past the end."""
+        current, offset = self.nearest(line, 0)
+        return skip_lines(self.fd, offset, line - current)[0]
+
+    def offset_line(self, offset):
+        line, start = self.nearest(offset, 1)
+        return count_lines(self.fd, line, start, offset)[0]
+
+    def read(self, start, end):
+        return os.pread(self.fd, max(0, end - start), start)
+
+    def show_lines(self, first):
+        first = max(0, first)
+        self.size = os.fstat(self.fd).st_size
+        start = self.line_offset(first)
+        end, count = skip_lines(self.fd, start, WINDOW_LINES)
+
+        self.shifting = True
+        self.buff.begin_irreversible_action()
+        self.buff.set_text(self.read(start, end).decode("utf-8", "replace"))
+        self.buff.end_irreversible_action()
+        self.buff.set_modified(False)
+        self.first = first
+        self.count = count
+        self.end_offset = end
+        self.shifting = False
+
+    def visible_lines(self):
+        rect = self.view.get_visible_rect()
+        top, _ = self.view.get_line_at_y(rect.y)
+        bottom, _ = self.view.get_line_at_y(rect.y + rect.height)
+        return top.get_line(), bottom.get_line()
+
+    def on_scrolled(self, adj):
+        if self.shifting or self.fd is None:
+            return
+
+        top, bottom = self.visible_lines()
+        at_end = self.end_offset >= self.size
+
+        if top < EDGE_LINES and self.first > 0:
+            self.scroll_window(self.first + top)
+        elif bottom > self.count - EDGE_LINES and not at_end:
+            self.scroll_window(self.first + top)
+
+    def scroll_window(self, top_line):
+        # Recenter the window on the viewport and keep the same line on top
+        self.show_lines(top_line - WINDOW_LINES // 2)
+        self.shifting = True
+        success, it = self.buff.get_iter_at_line(top_line - self.first)
+        if success:
+            self.view.scroll_to_iter(it, 0, True, 0, 0)
+        self.shifting = False
+
+    def go_to_line(self, line, located=False):
+        if self.total_lines is not None:
+            line = min(line, self.total_lines - 1)
+        if not self.first <= line < self.first + self.count:
+            first = max(0, line - WINDOW_LINES // 2)
+            # Past what is indexed, the scan would block the main loop
+            if not located and not self.covered(first):
+                self.locate_async(first, lambda: self.go_to_line(line, True))
+                return
+            self.show_lines(first)
+
+        success, it = self.buff.get_iter_at_line(line - self.first)
+        if success:
+            self.shifting = True
+            self.buff.place_cursor(it)
+            self.view.scroll_to_iter(it, 0.2, False, 0, 0)
+            self.shifting = False
+
+    def locate_async(self, line, callback):
+        """Find where line starts on a worker thread, then call callback()."""
+        generation = self.generation
+
+        def deliver(mark):
+            if generation == self.generation:
+                self.add_marks([mark])
+                callback()
+            return False
+
+        def run():
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                return
+            try:
+                mark = self.locate(fd, line)
+            finally:
+                os.close(fd)
+            glib.idle_add(deliver, mark)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def selection_iters(self):
+        buff = self.buff
+        if buff.get_has_selection():
+            start, end = buff.get_selection_bounds()
+        else:
+            start = end = buff.get_iter_at_mark(buff.get_insert())
+        return start, end
+
+    def iter_offset(self, it):
+        """Absolute byte offset in the file of a buffer iter."""
+        success, line_start = self.buff.get_iter_at_line(it.get_line())
+        text = self.buff.get_text(line_start, it, False)
+        return self.line_offset(self.first + it.get_line()) + \
+            len(text.encode("utf-8"))
+
+    def find_async(self, pattern, forward, cancellable, callback, budget,
+                   on_slow):
+        """
+        Look for the next match of a compiled bytes pattern, wrapping
+        around, off the main loop, then call callback((start, end)) or
+        callback(None). The search runs in a child process over its own
+        mapping, so neither a runaway regex nor a file truncated under it
+        can take the editor down; with a budget it is killed like a
+        budgeted scan. The worker thread also finds the lines around the
+        match, so selecting it needs no long scan.
+        """
+        start, end = self.selection_iters()
+        pos = self.iter_offset(end if forward else start)
+        generation = self.generation
+
+        def deliver(found, marks):
+            if not cancellable.is_cancelled() and \
+                    generation == self.generation:
+                self.add_marks(marks)
+                callback(found)
+            return False
+
+        def give_up():
+            if not cancellable.is_cancelled():
+                on_slow()
+            return False
+
+        def run():
+            found = []
+            try:
+                search.run_in_child(
+                    worker.find_in_file,
+                    (self.path, pattern.pattern, pattern.flags, pos,
+                     forward),
+                    cancellable, budget or float("inf"),
+                    lambda message: found.append(message[1]))
+            except TimeoutError:
+                glib.idle_add(give_up)
+                return
+            if not found:
+                return
+            if found[0] is None:
+                glib.idle_add(deliver, None, [])
+                return
+
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                return
+            try:
+                line, line_start = count_lines(
+                    fd, *self.nearest(found[0][0], 1), found[0][0])
+                marks = [(line, line_start),
+                         self.locate(fd, max(0, line - WINDOW_LINES // 2))]
+            finally:
+                os.close(fd)
+            glib.idle_add(deliver, found[0], marks)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def select(self, start, end):
+        line = self.offset_line(start)
+        self.go_to_line(line)
+
+        line_start = self.line_offset(line)
+        col = len(self.read(line_start, start).decode("utf-8", "replace"))
+        length = len(self.read(start, end).decode("utf-8", "replace"))
+
+        success, it = self.buff.get_iter_at_line(line - self.first)
+        if not success:
+            return line
+        it.forward_chars(col)
+        end_it = it.copy()
+        end_it.forward_chars(length)
+
+        self.shifting = True
+        self.buff.select_range(it, end_it)
+        self.view.scroll_to_iter(it, 0.25, False, 0.0, 0.5)
+        self.shifting = False
+        return line
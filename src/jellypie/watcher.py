@@ -0,0 +1,154 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+from .helper import gio, glib
+
+COALESCE_DELAY = 300
+
+EVENTS = {
+    gio.FileMonitorEvent.CHANGED,
+    gio.FileMonitorEvent.CHANGES_DONE_HINT,
+    gio.FileMonitorEvent.CREATED,
+    gio.FileMonitorEvent.DELETED,
+    gio.FileMonitorEvent.RENAMED,
+    gio.FileMonitorEvent.MOVED_IN,
+    gio.FileMonitorEvent.MOVED_OUT,
+}
+
+
+class Watch:
+    def __init__(self, watcher, path, paths, callback, args):
+        self.watcher = watcher
+        self.path = path
+        self.paths = paths
+        self.callback = callback
+        self.args = args
+        self.timeout_id = None
+
+    def schedule(self):
+        # Restart the timer so a burst of events fires once, after it ends
+        if self.timeout_id is not None:
+            glib.source_remove(self.timeout_id)
+        self.timeout_id = glib.timeout_add(COALESCE_DELAY, self.fire)
+
+    def fire(self):
+        self.timeout_id = None
+        self.callback(*self.args)
+        return False
+
+    def cancel(self):
+        if self.timeout_id is not None:
+            glib.source_remove(self.timeout_id)
+            self.timeout_id = None
+        self.watcher.remove(self)
+
+
+def real_path(path):
+    """path with symlinks resolved, keeping a trailing separator."""
+    real = os.path.realpath(path)
+    return os.path.join(real, "") if path.endswith(os.sep) else real
+
+
+class DirectoryWatcher:
+    """
+    One directory monitor per parent directory, shared by all open files.
+
+    Watching the directory instead of the file keeps working when a writer
+    replaces the file by renaming a temp file over it, which leaves a file
+    monitor attached to the old inode. Events are matched to watches by
+    path, including the target of a rename. Symlinks are resolved, so a
+    link into another folder follows the file it points to.
+    """
+
+    def __init__(self):
+        self.monitors = {}
+        self.watches = {}
+
+    def watch(self, path, callback, *args):
+        """Call callback(*args) once a burst of changes to path is over."""
+        # A symlink is followed to the file writers actually replace; the
+        # link itself is watched too, in case it is pointed elsewhere
+        paths = [real_path(path)]
+        if os.path.abspath(path) != paths[0]:
+            paths.append(os.path.abspath(path))
+
+        for watched in paths:
+            self.monitor(watched)
+        watch = Watch(self, path, paths, callback, args)
+        for watched in paths:
+            self.watches.setdefault(watched, []).append(watch)
+        return watch
+
+    def monitor(self, path):
+        directory = os.path.dirname(path)
+        if directory in self.monitors or path in self.monitors:
+            return
+        try:
+            monitor = gio.File.new_for_path(directory).monitor_directory(
+                gio.FileMonitorFlags.WATCH_MOVES, None)
+        except glib.Error:
+            # Fall back to the file itself where the directory cannot be
+            # watched
+            try:
+                monitor = gio.File.new_for_path(path).monitor_file(
+                    gio.FileMonitorFlags.WATCH_MOVES, None)
+            except glib.Error as e:
+                print(f"Warning: Could not watch {path}: {e.message}")
+                return
+            directory = path
+        monitor.connect("changed", self.on_changed)
+        self.monitors[directory] = monitor
+
+    def watch_children(self, directory, callback, *args):
+        """Call callback(*args) once a burst of changes in directory is over."""
+        return self.watch(os.path.join(directory, ""), callback, *args)
+
+    def remove(self, watch):
+        for path in watch.paths:
+            watches = self.watches.get(path, [])
+            if watch in watches:
+                watches.remove(watch)
+            if not watches:
+                self.watches.pop(path, None)
+
+            directory = os.path.dirname(path)
+            if not any(os.path.dirname(other) == directory
+                       for other in self.watches):
+                self.unmonitor(directory)
+            if path not in self.watches:
+                self.unmonitor(path)
+
+    def unmonitor(self, path):
+        monitor = self.monitors.pop(path, None)
+        if monitor:
+            monitor.cancel()
+
+    def on_changed(self, monitor, file, other_file, event_type):
+        if event_type not in EVENTS:
+            return
+
+        paths = {file.get_path()}
+        if other_file is not None:
+            paths.add(other_file.get_path())
+        # Watches on the whole directory end in a separator
+        paths.update({os.path.join(os.path.dirname(path), "")
+                      for path in paths})
+        for path in paths:
+            for watch in self.watches.get(path, []):
+                watch.schedule()
@@ -17,6 +17,7 @@
 
 
 import os
+from . import compress
 from . import menu
 from . import notebook
 from . import statusbar
@@ -73,14 +74,19 @@ class MainWindow(gtk.ApplicationWindow):
         if not os.path.exists(filepath):
             try:
                 os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                with open(filepath, 'w') as f:
-                    f.write("")  # Create empty file
+                with open(filepath, 'wb') as f:
+                    # Create empty file
+                    f.write(compress.compress(
+                        compress.codec_for(filepath), b""))
             except Exception as e:
                 print(f"Warning: Could not create file {filepath}: {e}")
 
         # Load the file
         if os.path.exists(filepath):
             self.menu.open_file([filepath])
+            # Bring back edits that were never saved before a crash
+            if self.nb.files.get(self.nb.key) == filepath:
+                self.nb.recover_journal(self.nb.key)
         else:
             # Fallback if file creation failed
             self.nb.new_tab("Untitled", tooltip="Untitled")
@@ -0,0 +1,124 @@
+# Copyright (c) 2026 John Dalbey
+
+# This file is part of Jellypie.
+
+# Jellypie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Jellypie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License along
+# with Jellypie. if not, see <https://www.gnu.org/licenses/>.
+
+
+# Runs in a child process, so this module imports nothing from the
+# toolkit and starts quickly
+
+import mmap
+import re
+import time
+
+BATCH = 1000
+BATCH_SECONDS = 0.1
+# Bytes searched at a time when looking backwards
+SEARCH_STEP = 4 * 1024 * 1024
+
+
+def find_all(conn, text, pattern, flags):
+    """
+    Send the offsets of every match of pattern in text through conn, in
+    batches of ("batch", starts, ends), then ("done",).
+    """
+    compiled = re.compile(pattern, flags)
+    starts = []
+    ends = []
+    sent = time.monotonic()
+    for match in compiled.finditer(text):
+        starts.append(match.start())
+        ends.append(match.end())
+        now = time.monotonic()
+        if len(starts) >= BATCH or now - sent > BATCH_SECONDS:
+            conn.send(("batch", starts, ends))
+            starts = []
+            ends = []
+            sent = now
+    conn.send(("batch", starts, ends))
+    conn.send(("done",))
+    conn.close()
+
+
+def plan_all(conn, text, pattern, flags, template, use_regex, known):
+    """
+    Send every substitution of a replace-all through conn, in batches of
+    ("batch", starts, ends, texts, lines), then ("done",). A bad template
+    sends ("error", message) first.
+    """
+    compiled = re.compile(pattern, flags)
+    if known is None:
+        matches = compiled.finditer(text)
+    else:
+        matches = filter(None, (compiled.match(text, i) for i in known))
+
+    batch = ([], [], [], [])
+    sent = time.monotonic()
+    line = 0
+    last = 0
+    try:
+        for match in matches:
+            start = match.start()
+            line += text.count("\n", last, start)
+            last = start
+            batch[0].append(start)
+            batch[1].append(match.end())
+            batch[2].append(
+                match.expand(template) if use_regex else template)
+            batch[3].append(line)
+            now = time.monotonic()
+            if len(batch[0]) >= BATCH or now - sent > BATCH_SECONDS:
+                conn.send(("batch",) + batch)
+                batch = ([], [], [], [])
+                sent = now
+    except (re.error, IndexError) as e:
+        conn.send(("error", str(e)))
+    else:
+        conn.send(("batch",) + batch)
+    conn.send(("done",))
+    conn.close()
+
+
+def search_backward(data, pattern, low, high):
+    """Last match of pattern in data[low:high], a SEARCH_STEP at a time."""
+    while high > low:
+        chunk_start = max(low, high - SEARCH_STEP)
+        last = None
+        for last in pattern.finditer(data, chunk_start, high):
+            pass
+        if last is not None:
+            return last
+        high = chunk_start
+    return None
+
+
+def find_next(data, pattern, pos, forward=True):
+    """(start, end) of the next match from pos, wrapping around, or None."""
+    if forward:
+        match = pattern.search(data, pos) or pattern.search(data, 0, pos)
+    else:
+        match = search_backward(data, pattern, 0, pos) or \
+            search_backward(data, pattern, pos, len(data))
+    return (match.start(), match.end()) if match else None
+
+
+def find_in_file(conn, path, pattern, flags, pos, forward):
+    """Send ("found", span) for find_next over a mapping of path."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    conn.send(("found", find_next(data, re.compile(pattern, flags), pos,
+                                  forward)))
+    conn.send(("done",))
+    conn.close()